@@ -0,0 +1,59 @@
+"""
+Benchmark the working mode wake cycle of the hydrometer on CPython.
+
+The firmware runs against the simulated hardware of tools/host/sim.py; the
+awake time is the simulated time the ESP32 would spend from the wake up to
+the next deep sleep, and the per-phase breakdown comes from the PhaseTimer
+history kept in the RTC memory.
+
+Usage:
+    python tools/bench_cycle.py [cycles]
+"""
+import sys
+
+import hostenv
+from hostenv import sim
+
+MAX_BOOTS_PER_CYCLE = 4
+
+
+def run_cycle(fw):
+    """
+    Boot from deep sleep, following the resets until the device sleeps again
+    :return: tuple; (total awake time in ms, deep sleep duration in ms)
+    """
+    sim.board.power_cycle_sensors()
+    cause = sim.DEEPSLEEP_RESET
+    awake_ms = 0
+    for _ in range(MAX_BOOTS_PER_CYCLE):
+        with hostenv.quiet():
+            outcome, arg, elapsed_ms = fw.boot(cause)
+        awake_ms += elapsed_ms
+        if outcome == 'deepsleep':
+            # the RTC keeps counting during the deep sleep
+            hostenv.utime.advance_ms(arg)
+            return awake_ms, arg
+        if outcome != 'reset':
+            break
+        cause = sim.SOFT_RESET
+    raise RuntimeError('The wake cycle did not end in deep sleep')
+
+
+def main(cycles=5):
+    fw = hostenv.Firmware()
+    try:
+        totals = []
+        for n in range(cycles):
+            awake_ms, sleep_ms = run_cycle(fw)
+            totals.append(awake_ms)
+            store = fw.module('rtcstore').RTCStore()
+            history = fw.module('phasetimer').PhaseTimer.load_history(store)
+            phases = history[-1] if history else {}
+            print('cycle %d: awake %5d ms, sleep %d ms  %s' % (n + 1, awake_ms, sleep_ms, phases))
+        print('mean awake time: %.0f ms' % (sum(totals) / len(totals)))
+    finally:
+        fw.cleanup()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,71 @@
+"""
+Compare the import cost of the firmware modules from source and from bytecode, on the ESP32.
+
+This script runs on the device, not on the PC. Build the image with
+`python tools/build.py --bench`, upload it, then in the REPL:
+    import bench_imports
+    bench_imports.run()
+
+The .mpy files are imported from the root of the flash, the sources from
+/bench/src. Each module is imported with its dependencies from a clean
+sys.modules, so the figures are what a boot would pay for that import.
+"""
+import gc
+import sys
+import utime
+
+SOURCE_DIR = '/bench/src'
+MODULES = (
+    'ready', 'rtcstore', 'phasetimer', 'configsnap', 'bootstate', 'batch', 'scheduler', 'battery',
+    'vector3d', 'imu', 'accelring', 'gy521', 'tempsensor', 'wifi', 'mqtt_client', 'microWebCli', 'microWebSrv', 'httpserver'
+)
+ROUNDS = 3
+
+
+def _unload(keep):
+    for name in list(sys.modules):
+        if name not in keep:
+            del sys.modules[name]
+
+
+def measure(name, source):
+    """
+    :return: tuple; (import time in us, heap used in bytes)
+    """
+    keep = set(sys.modules)
+    if source:
+        sys.path.insert(0, SOURCE_DIR)
+    gc.collect()
+    mem_free = gc.mem_free()
+    start = utime.ticks_us()
+    try:
+        __import__(name)
+        elapsed = utime.ticks_diff(utime.ticks_us(), start)
+        heap = mem_free - gc.mem_free()
+    finally:
+        if source:
+            sys.path.pop(0)
+        _unload(keep)
+    return elapsed, heap
+
+
+def run(modules=MODULES, rounds=ROUNDS):
+    print('%-14s %10s %10s %10s %10s' % ('module', 'src ms', 'mpy ms', 'src bytes', 'mpy bytes'))
+    for name in modules:
+        row = []
+        for source in (True, False):
+            results = []
+            for _ in range(rounds):
+                try:
+                    results.append(measure(name, source))
+                except ImportError as e:
+                    print(name + ': ' + str(e))
+                    break
+            if not results:
+                row = None
+                break
+            results.sort()
+            row.append(results[len(results) // 2])
+        if row:
+            (src_us, src_heap), (mpy_us, mpy_heap) = row
+            print('%-14s %10.1f %10.1f %10d %10d' % (name, src_us / 1000, mpy_us / 1000, src_heap, mpy_heap))
@@ -0,0 +1,71 @@
+"""
+Microbenchmark of the register decoding of torpedo/imu.py on CPython.
+
+The MPU6050 is put on a fake I2C bus which returns fixed register values
+without any simulated latency, so only the Python work of a read is timed:
+the legacy per-byte decode (bytes_toint, scale tuple and accel_range register
+read per axis) against the ustruct decode with the precomputed scale.
+CPython figures only give the ratio, the ESP32 is about two orders of
+magnitude slower.
+
+Usage:
+    python tools/bench_imu.py [reads]
+"""
+import sys
+import timeit
+
+import hostenv
+
+REGISTERS = bytearray(128)
+# accel (0.01, 0.71, 0.70 g), temperature (20 C) and gyro of a sample
+REGISTERS[0x3B:0x49] = bytes.fromhex('00a42d702cd0f3640009fffa0004')
+REGISTERS[0x75] = 0x68
+
+
+class FakeI2C:
+    """
+    I2C bus answering from a static register map
+    """
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        buf[:] = REGISTERS[memaddr:memaddr + len(buf)]
+
+    def writeto_mem(self, addr, memaddr, buf):
+        REGISTERS[memaddr:memaddr + len(buf)] = buf
+
+
+def legacy_accel_callback(mpu, bytes_toint):
+    """
+    The decoding of MPU6050._accel_callback before the ustruct decode
+    """
+    mpu._read(mpu.buf6, 0x3B, mpu.mpu_addr)
+    mpu._accel._ivector[0] = bytes_toint(mpu.buf6[0], mpu.buf6[1])
+    mpu._accel._ivector[1] = bytes_toint(mpu.buf6[2], mpu.buf6[3])
+    mpu._accel._ivector[2] = bytes_toint(mpu.buf6[4], mpu.buf6[5])
+    scale = (16384, 8192, 4096, 2048)
+    mpu._accel._vector[0] = mpu._accel._ivector[0]/scale[mpu.accel_range]
+    mpu._accel._vector[1] = mpu._accel._ivector[1]/scale[mpu.accel_range]
+    mpu._accel._vector[2] = mpu._accel._ivector[2]/scale[mpu.accel_range]
+
+
+def main(reads=20000):
+    fw = hostenv.Firmware()
+    try:
+        imu = fw.module('imu')
+        mpu = imu.MPU6050(sda=21, scl=22)
+        mpu._mpu_i2c = FakeI2C()
+        cases = [
+            ('legacy accel decode', lambda: legacy_accel_callback(mpu, imu.bytes_toint)),
+            ('accel decode', mpu._accel_callback),
+            ('accel.xyz', lambda: mpu.accel.xyz),
+            ('read_motion (accel, temp, gyro)', mpu.read_motion),
+        ]
+        for name, func in cases:
+            seconds = min(timeit.repeat(func, number=reads, repeat=3))
+            print('%-32s %6.2f us/read' % (name, seconds / reads * 1e6))
+        print('values: accel %s, gyro %s' % (mpu.accel.xyz, mpu.gyro.xyz))
+    finally:
+        fw.cleanup()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,67 @@
+"""
+Noise of the tilt angle against the number of samples it needs, for each
+acquisition profile of GY521, on the simulated MPU6050 of tools/host.
+
+For each profile, the noise of a single tilt sample is measured on 64
+samples, which gives the number of samples (and the time at the sample rate
+of the profile) needed for the standard error of the mean to reach the
+tolerance of GY521.measure_tilt(). measure_tilt() is then run a number of
+times, to see how far apart its results are and how long it takes.
+The noise model of the simulation scales with the bandwidth of the DLPF,
+the figures of a real sensor are in the same ballpark but not identical.
+
+Usage:
+    python tools/bench_tilt.py [runs]
+"""
+import math
+import sys
+
+import hostenv
+from hostenv import utime
+
+TOLERANCE = 0.05  # degree, the default of GY521.measure_tilt()
+NOISE_SAMPLES = 64
+
+
+def sample_noise(gy521):
+    """
+    :return: float; standard deviation of single tilt samples in degree
+    """
+    angles = []
+    for _ in range(NOISE_SAMPLES):
+        gy521.imu.data_ready  # clear the flag, then wait for a fresh sample
+        while not gy521.imu.data_ready:
+            utime.sleep_ms(1)
+        angles.append(gy521.get_tilt_angles()[1])
+    mean = sum(angles) / len(angles)
+    return math.sqrt(sum((a - mean) ** 2 for a in angles) / (len(angles) - 1))
+
+
+def main(runs=20):
+    fw = hostenv.Firmware()
+    try:
+        # the modules which gy521 imports lazily
+        for name in ('imu', 'estimator', 'tiltlut'):
+            fw.module(name)
+        gy521_module = fw.module('gy521')
+        print('%-9s %9s %8s %9s | %11s %8s' % ('profile', 'noise deg', 'samples', 'time ms',
+                                                  'spread deg', 'ms/run'))
+        for profile in [None] + sorted(gy521_module.GY521.PROFILES):
+            gy521 = gy521_module.GY521(21, 22, 32, profile=profile)
+            noise = sample_noise(gy521)
+            needed = max(8, int(math.ceil((noise / TOLERANCE) ** 2)))
+            results = []
+            start = utime.ticks_ms()
+            for _ in range(runs):
+                results.append(gy521.measure_tilt()[0])
+            elapsed = utime.ticks_diff(utime.ticks_ms(), start)
+            mean = sum(results) / len(results)
+            spread = math.sqrt(sum((r - mean) ** 2 for r in results) / (len(results) - 1))
+            print('%-9s %9.3f %8d %9.0f | %11.3f %8.0f' % (profile or 'default', noise, needed,
+                                                           needed * 1000 / gy521.rate_hz, spread, elapsed / runs))
+    finally:
+        fw.cleanup()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
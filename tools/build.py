@@ -0,0 +1,214 @@
+"""
+Build a deployable image of the hydrometer firmware.
+
+Every module of the torpedo folder (lib included) but main.py is cross-compiled
+to .mpy bytecode with mpy-cross, so that the ESP32 does not compile the sources
+at every wake. The imports of all the modules are checked against the firmware
+modules and the modules built into MicroPython before anything is compiled.
+
+The image directory mirrors the flash file system and can be uploaded as it is
+(e.g. with `mpremote cp -r build/image/. :`). Remove the old .py files from the
+flash first: MicroPython imports a .py file in preference to the .mpy one.
+
+The mpy-cross version must match the MicroPython firmware of the ESP32, it can
+be installed with `pip install mpy-cross==<firmware version>`.
+
+Usage:
+    python tools/build.py [--out build/image] [--mpy-cross PATH] [--bench]
+
+With --bench, the sources and tools/bench_imports.py are added to the image to
+compare the import cost of the sources and of the bytecode on the device.
+"""
+import argparse
+import ast
+import os
+import shutil
+import subprocess
+import sys
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+FIRMWARE_DIR = os.path.join(os.path.dirname(TOOLS_DIR), 'torpedo')
+DEFAULT_OUT = os.path.join(os.path.dirname(TOOLS_DIR), 'build', 'image')
+BENCH_SOURCE_DIR = os.path.join('bench', 'src')
+
+# Run as source by the ESP32 at boot
+KEEP_SOURCE = ('boot.py', 'main.py')
+# Modules built into the MicroPython firmware of the ESP32
+BUILTIN_MODULES = {
+    '_thread', 'array', 'binascii', 'btree', 'builtins', 'cmath', 'collections', 'cryptolib', 'deflate',
+    'ds18x20', 'errno', 'esp', 'esp32', 'framebuf', 'gc', 'hashlib', 'heapq', 'io', 'json', 'machine',
+    'math', 'micropython', 'neopixel', 'network', 'ntptime', 'onewire', 'os', 'platform', 'random', 're',
+    'select', 'socket', 'ssl', 'struct', 'sys', 'time', 'uasyncio', 'ubinascii', 'ucollections',
+    'ucryptolib', 'uctypes', 'uerrno', 'uhashlib', 'uheapq', 'uio', 'ujson', 'uos', 'urandom', 'ure',
+    'uselect', 'usocket', 'ussl', 'ustruct', 'usys', 'utime', 'uzlib', 'webrepl', 'zlib'
+}
+
+
+def find_sources():
+    """
+    :return: list; paths of the Python files relative to the torpedo folder
+    """
+    sources = []
+    for root, dirs, files in os.walk(FIRMWARE_DIR):
+        dirs[:] = sorted(d for d in dirs if d not in ('www', '__pycache__'))
+        for name in sorted(files):
+            if name.endswith('.py'):
+                sources.append(os.path.relpath(os.path.join(root, name), FIRMWARE_DIR))
+    return sources
+
+
+def module_path(name):
+    """
+    :return: str; path of the firmware module relative to the torpedo folder, None if it is not a firmware module
+    """
+    base = os.path.join(*name.split('.'))
+    for candidate in (base + '.py', os.path.join(base, '__init__.py'),
+                      os.path.join('lib', base + '.py'), os.path.join('lib', base, '__init__.py')):
+        if os.path.isfile(os.path.join(FIRMWARE_DIR, candidate)):
+            return candidate
+    return None
+
+
+def top_level_names(tree):
+    names = set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.Assign):
+            names.update(t.id for t in node.targets if isinstance(t, ast.Name))
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split('.')[0] for alias in node.names)
+    return names
+
+
+def _imports(tree):
+    """
+    Yield (node, optional) for the import statements; the imports guarded by a try block are optional
+    """
+    def walk(node, optional):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.Import, ast.ImportFrom)):
+                yield child, optional
+            else:
+                yield from walk(child, optional or isinstance(child, ast.Try))
+    return walk(tree, False)
+
+
+def check_imports(sources):
+    """
+    Check that every import resolves to a firmware module or a MicroPython module
+    :return: tuple; (list of errors, list of warnings)
+    """
+    errors, warnings = [], []
+    trees = {}
+    for path in sources:
+        with open(os.path.join(FIRMWARE_DIR, path), encoding='utf8') as f:
+            try:
+                trees[path] = ast.parse(f.read(), path)
+            except SyntaxError as e:
+                errors.append('%s:%d: %s' % (path, e.lineno, e.msg))
+    for path, tree in trees.items():
+        package = os.path.dirname(path).replace(os.sep, '.')
+        for node, optional in _imports(tree):
+            if isinstance(node, ast.ImportFrom):
+                name = node.module or ''
+                if node.level:
+                    parts = package.split('.') if package else []
+                    parts = parts[:len(parts) - node.level + 1]
+                    name = '.'.join(parts + ([name] if name else []))
+                targets = [(name, [alias.name for alias in node.names])]
+            else:
+                targets = [(alias.name, []) for alias in node.names]
+            for name, imported in targets:
+                found = module_path(name)
+                if found is None:
+                    if name.split('.')[0] in BUILTIN_MODULES:
+                        continue
+                    message = '%s:%d: cannot resolve "import %s"' % (path, node.lineno, name)
+                    (warnings if optional else errors).append(message)
+                    continue
+                if found not in trees:
+                    continue
+                defined = top_level_names(trees[found])
+                for attr in imported:
+                    if attr != '*' and attr not in defined and module_path(name + '.' + attr) is None:
+                        errors.append('%s:%d: "%s" is not defined in %s' % (path, node.lineno, attr, found))
+    return errors, warnings
+
+
+def find_mpy_cross(path=None):
+    if path:
+        return [path]
+    if shutil.which('mpy-cross'):
+        return ['mpy-cross']
+    try:
+        import mpy_cross  # noqa: F401
+    except ImportError:
+        raise SystemExit('mpy-cross not found, install it with "pip install mpy-cross" or pass --mpy-cross')
+    return [sys.executable, '-m', 'mpy_cross']
+
+
+def build(out, mpy_cross, bench=False):
+    sources = find_sources()
+    errors, warnings = check_imports(sources)
+    for message in warnings:
+        print('warning: ' + message)
+    if errors:
+        for message in errors:
+            print('error: ' + message)
+        raise SystemExit('%d import error(s), nothing has been built' % len(errors))
+
+    if os.path.isdir(out):
+        shutil.rmtree(out)
+    os.makedirs(out)
+    # data files and the web pages are copied as they are
+    for root, dirs, files in os.walk(FIRMWARE_DIR):
+        dirs[:] = [d for d in dirs if d != '__pycache__']
+        for name in files:
+            path = os.path.relpath(os.path.join(root, name), FIRMWARE_DIR)
+            if name.endswith('.py') and os.path.basename(path) not in KEEP_SOURCE:
+                continue
+            os.makedirs(os.path.join(out, os.path.dirname(path)), exist_ok=True)
+            shutil.copy(os.path.join(FIRMWARE_DIR, path), os.path.join(out, path))
+
+    compiled = 0
+    for path in sources:
+        if os.path.basename(path) in KEEP_SOURCE:
+            continue
+        target = os.path.join(out, path[:-3] + '.mpy')
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # the source name is kept in the bytecode for the tracebacks
+        subprocess.run(mpy_cross + ['-s', path, '-o', target, os.path.join(FIRMWARE_DIR, path)], check=True)
+        compiled += 1
+
+    if bench:
+        for path in sources:
+            if os.path.basename(path) not in KEEP_SOURCE:
+                target = os.path.join(out, BENCH_SOURCE_DIR, path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copy(os.path.join(FIRMWARE_DIR, path), target)
+        shutil.copy(os.path.join(TOOLS_DIR, 'bench_imports.py'), out)
+
+    size = sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(out) for name in files)
+    print('%d modules compiled, image of %d bytes in %s' % (compiled, size, out))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a deployable image of the hydrometer firmware')
+    parser.add_argument('--out', default=DEFAULT_OUT, help='image directory, default: build/image')
+    parser.add_argument('--mpy-cross', help='path of the mpy-cross executable')
+    parser.add_argument('--bench', action='store_true', help='add the sources and the import benchmark to the image')
+    parser.add_argument('--check', action='store_true', help='only check the imports')
+    args = parser.parse_args()
+    if args.check:
+        errors, warnings = check_imports(find_sources())
+        for message in warnings:
+            print('warning: ' + message)
+        for message in errors:
+            print('error: ' + message)
+        sys.exit(1 if errors else 0)
+    build(args.out, find_mpy_cross(args.mpy_cross), args.bench)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+"""
+CPython stand-in for the MicroPython esp module.
+"""
+
+
+def osdebug(level):
+    pass
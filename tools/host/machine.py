@@ -0,0 +1,176 @@
+"""
+CPython stand-in for the MicroPython machine module, backed by sim.board.
+"""
+import micropython
+import utime
+from sim import board, PWRON_RESET, HARD_RESET, WDT_RESET, DEEPSLEEP_RESET, SOFT_RESET  # noqa: F401
+
+
+class DeepSleep(BaseException):
+    """
+    Raised by deepsleep() to end the simulated wake cycle
+    """
+    def __init__(self, time_ms):
+        super().__init__(time_ms)
+        self.time_ms = time_ms
+
+
+class Reset(BaseException):
+    """
+    Raised by reset() to end the simulated run
+    """
+    pass
+
+
+def reset_cause():
+    return board.reset_cause
+
+
+def deepsleep(time_ms=0):
+    raise DeepSleep(time_ms)
+
+
+def reset():
+    raise Reset()
+
+
+def unique_id():
+    return b'\x30\xae\xa4\x1c\x2d\x58'
+
+
+def freq(hz=None):
+    return 240000000
+
+
+def idle():
+    """
+    Wait for the next interrupt and run the callbacks it has scheduled. The
+    only interrupt simulated is the INT pin of the MPU6050, without it the
+    clock moves by 1 ms.
+    """
+    board.idle()
+    micropython.run_scheduled()
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 2
+    PULL_DOWN = 1
+    PULL_HOLD = 4
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self, pin, mode=-1, pull=-1, value=None):
+        self.pin = pin
+        self.mode = mode
+        self._value = value or 0
+        self.handler = None
+
+    def value(self, val=None):
+        if val is None:
+            return self._value
+        self._value = 1 if val else 0
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    def irq(self, handler=None, trigger=IRQ_FALLING):
+        self.handler = handler
+        if handler is None:
+            board.pin_irqs.pop(self.pin, None)
+        else:
+            board.pin_irqs[self.pin] = (self, handler)
+
+
+class Signal:
+    def __init__(self, pin, invert=False):
+        self.pin = pin
+        self.invert = invert
+
+    def value(self, val=None):
+        if val is None:
+            return self.pin.value() ^ self.invert
+        self.pin.value(bool(val) ^ self.invert)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+
+class ADC:
+    def __init__(self, pin):
+        self.pin = pin
+
+    def read(self):
+        return board.battery_adc
+
+
+class I2C:
+    def __init__(self, id=-1, scl=None, sda=None, freq=100000):
+        self.freq = freq
+        self.devices = {board.mpu.ADDR: board.mpu}
+
+    def _charge(self, nbytes):
+        # start, address, register, restart, address, data and stop
+        utime.advance_us((nbytes + 4) * 9 * 1000000 // self.freq)
+
+    def _device(self, addr):
+        try:
+            return self.devices[addr]
+        except KeyError:
+            raise OSError(19)  # ENODEV
+
+    def scan(self):
+        utime.advance_ms(20)
+        return sorted(self.devices)
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        self._charge(len(buf))
+        buf[:] = self._device(addr).read(memaddr, len(buf))
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        buf = bytearray(nbytes)
+        self.readfrom_mem_into(addr, memaddr, buf)
+        return bytes(buf)
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self._charge(len(buf))
+        self._device(addr).write(memaddr, bytes(buf))
+
+
+class RTC:
+    def memory(self, data=None):
+        if data is None:
+            return board.rtc_memory
+        if len(data) > 2048:
+            raise ValueError('buffer too long')
+        board.rtc_memory = bytes(data)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1):
+        self.callback = None
+
+    def init(self, period=0, mode=PERIODIC, callback=None):
+        self.callback = callback
+
+    def deinit(self):
+        self.callback = None
@@ -0,0 +1,35 @@
+"""
+CPython stand-in for the MicroPython micropython module.
+"""
+
+
+SCHEDULE_DEPTH = 8  # as on the ESP32 port
+
+_scheduled = []
+
+
+def const(value):
+    return value
+
+
+def schedule(func, arg):
+    if len(_scheduled) >= SCHEDULE_DEPTH:
+        raise RuntimeError('schedule queue full')
+    _scheduled.append((func, arg))
+
+
+def run_scheduled():
+    """
+    Run the scheduled callbacks, as the VM does between two bytecodes
+    """
+    while _scheduled:
+        func, arg = _scheduled.pop(0)
+        func(arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def mem_info(*args):
+    pass
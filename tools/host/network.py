@@ -0,0 +1,116 @@
+"""
+CPython stand-in for the MicroPython network module, backed by sim.board.
+"""
+import utime
+from sim import board
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_GOT_IP = 1010
+STAT_NO_AP_FOUND = 201
+STAT_WRONG_PASSWORD = 202
+
+_interfaces = {}
+
+
+def WLAN(interface=STA_IF):
+    if interface not in _interfaces:
+        _interfaces[interface] = _WLAN(interface)
+    return _interfaces[interface]
+
+
+def reset():
+    """
+    Forget the state of the radio, as a reboot would
+    """
+    _interfaces.clear()
+
+
+class _WLAN:
+    def __init__(self, interface):
+        self.interface = interface
+        self._active = False
+        self._status = STAT_IDLE
+        self._connected_at = None
+        self._ap = None
+        self._static = None
+        self._ifconfig = ('0.0.0.0', '0.0.0.0', '0.0.0.0', '0.0.0.0')
+        self._config = {'essid': '', 'channel': 1, 'mac': b'\x30\xae\xa4\x1c\x2d\x58'}
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        if is_active and not self._active:
+            utime.advance_ms(80)  # radio calibration
+            if self.interface == AP_IF:
+                self._ifconfig = ('192.168.4.1', '255.255.255.0', '192.168.4.1', '0.0.0.0')
+        if not is_active:
+            self.disconnect()
+        self._active = bool(is_active)
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config[args[0]]
+        self._config.update(kwargs)
+
+    def ifconfig(self, cfg=None):
+        if cfg is None:
+            return self._ifconfig
+        if cfg == 'dhcp':
+            self._static = None
+            return
+        self._static = tuple(cfg)
+        self._ifconfig = tuple(cfg)
+
+    def scan(self):
+        utime.advance_ms(board.SCAN_MS)
+        return [(ap.ssid.encode(), ap.bssid, ap.channel, ap.rssi, 3, False) for ap in board.aps]
+
+    def connect(self, ssid=None, password=None, bssid=None):
+        if not self._active:
+            raise OSError('STA must be active')
+        ap = board.find_ap(ssid)
+        self._ap = None
+        self._connected_at = None
+        if ap is None or (bssid is not None and bytes(bssid) != ap.bssid):
+            self._status = STAT_NO_AP_FOUND
+            return
+        if ap.password != (password or ''):
+            self._status = STAT_WRONG_PASSWORD
+            return
+        latency = board.ASSOC_MS
+        # A directed connect on the right channel skips the channel scan
+        if bssid is None or self._config.get('channel') != ap.channel:
+            latency += board.SCAN_MS
+        if self._static is None:
+            latency += board.DHCP_MS
+        self._ap = ap
+        self._status = STAT_CONNECTING
+        self._connected_at = utime.ticks_ms() + latency
+
+    def isconnected(self):
+        if self._connected_at is None:
+            return False
+        if utime.ticks_diff(utime.ticks_ms(), self._connected_at) < 0:
+            return False
+        if self._status != STAT_GOT_IP:
+            self._status = STAT_GOT_IP
+            self._config['essid'] = self._ap.ssid
+            self._config['channel'] = self._ap.channel
+            if self._static is None:
+                self._ifconfig = ('192.168.4.2', '255.255.255.0', '192.168.4.1', '192.168.4.1')
+        return True
+
+    def status(self, *args):
+        if args == ('rssi',):
+            return self._ap.rssi if self._ap else 0
+        self.isconnected()
+        return self._status
+
+    def disconnect(self):
+        self._connected_at = None
+        self._ap = None
+        self._status = STAT_IDLE
@@ -0,0 +1,121 @@
+"""
+CPython stand-in for the MicroPython onewire module.
+Implements the byte level API on top of the DS18B20 models of sim.board.
+"""
+import utime
+from sim import board, crc8 as _crc8
+
+BYTE_US = 600  # 8 time slots of ~70us plus recovery
+
+
+class OneWireError(Exception):
+    pass
+
+
+class OneWire:
+    SEARCH_ROM = 0xF0
+    MATCH_ROM = 0x55
+    SKIP_ROM = 0xCC
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.devices = board.ds18
+        self._state = 'idle'
+        self._selected = []
+        self._rx = []
+        self._out = b''
+
+    def reset(self, required=False):
+        utime.advance_us(960)
+        present = bool(self.devices)
+        if required and not present:
+            raise OneWireError
+        self._state = 'rom'
+        self._selected = []
+        self._rx = []
+        self._out = b''
+        return present
+
+    def readbit(self):
+        utime.advance_us(70)
+        # a DS18B20 holds the line low while it is converting
+        for dev in self._selected:
+            if dev.busy():
+                return 0
+        return 1
+
+    def readbyte(self):
+        utime.advance_us(BYTE_US)
+        for dev in self._selected:
+            dev.busy()
+        if not self._out:
+            return 0xFF
+        byte, self._out = self._out[0], self._out[1:]
+        return byte
+
+    def readinto(self, buf):
+        for i in range(len(buf)):
+            buf[i] = self.readbyte()
+
+    def write(self, buf):
+        for b in buf:
+            self.writebyte(b)
+
+    def writebyte(self, value):
+        utime.advance_us(BYTE_US)
+        if self._state == 'rom':
+            if value == self.SKIP_ROM:
+                self._selected = list(self.devices)
+                self._state = 'func'
+            elif value == self.MATCH_ROM:
+                self._state = 'match'
+        elif self._state == 'match':
+            self._rx.append(value)
+            if len(self._rx) == 8:
+                rom = bytes(self._rx)
+                self._selected = [dev for dev in self.devices if dev.rom == rom]
+                self._rx = []
+                self._state = 'func'
+        elif self._state == 'func':
+            self._function(value)
+        elif self._state == 'write_scratch':
+            self._rx.append(value)
+            if len(self._rx) == 3:
+                for dev in self._selected:
+                    dev.scratch[2:5] = bytes(self._rx)
+                    dev.update_crc()
+                self._state = 'idle'
+
+    def _function(self, cmd):
+        if cmd == 0x44:  # Convert T
+            for dev in self._selected:
+                dev.start_conversion()
+        elif cmd == 0xBE and len(self._selected) == 1:  # Read Scratchpad
+            self._selected[0].busy()
+            self._out = bytes(self._selected[0].scratch)
+        elif cmd == 0x4E:  # Write Scratchpad
+            self._state = 'write_scratch'
+            self._rx = []
+            return
+        elif cmd == 0x48:  # Copy Scratchpad
+            utime.advance_ms(10)
+            for dev in self._selected:
+                dev.eeprom[:] = dev.scratch[2:5]
+        elif cmd == 0xB8:  # Recall E2
+            for dev in self._selected:
+                dev.scratch[2:5] = dev.eeprom
+                dev.update_crc()
+        self._state = 'idle'
+
+    def select_rom(self, rom):
+        self.reset()
+        self.writebyte(self.MATCH_ROM)
+        self.write(rom)
+
+    def scan(self):
+        # the search algorithm takes 3 time slots per ROM bit and device
+        utime.advance_us(960 + len(self.devices) * 64 * 3 * 70)
+        return [bytearray(dev.rom) for dev in self.devices]
+
+    def crc8(self, data):
+        return _crc8(data)
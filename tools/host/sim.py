@@ -0,0 +1,323 @@
+"""
+Simulated hardware of the hydrometer, used by the CPython stand-ins of the
+MicroPython modules (machine, network, onewire).
+
+All latencies are charged to the virtual clock of utime, so the ticks seen by
+the firmware reflect the time the real hardware would need.
+"""
+import math
+import random
+
+import utime
+
+# Reset causes as defined by the ESP32 port
+PWRON_RESET = 1
+HARD_RESET = 2
+WDT_RESET = 3
+DEEPSLEEP_RESET = 4
+SOFT_RESET = 5
+
+
+class FakeMPU6050:
+    """
+    Register level model of the MPU6050.
+    The hydrometer is rolled around its long (x) axis by `tilt` degrees, plus
+    white noise scaled with the DLPF bandwidth and an optional bobbing motion.
+    With `calm_ms`, the hydrometer rests that long after each bobbing period.
+    The accelerometer offsets drift by `accel_tc` (g/C per axis) from 25 C.
+    """
+    ADDR = 0x68
+    STARTUP_MS = 30
+    # accelerometer bandwidth (Hz) for DLPF_CFG 0-7
+    BANDWIDTH = (260, 184, 94, 44, 21, 10, 5, 260)
+    NOISE_DENSITY = 400e-6  # g/sqrt(Hz)
+    FIFO_SIZE = 1024
+
+    def __init__(self, tilt=45.0, temperature=20.0, bob_deg=0.0, bob_period_ms=2000, calm_ms=0,
+                 accel_tc=(0.0, 0.0, 0.0), seed=1):
+        self.tilt = tilt
+        self.temperature = temperature
+        self.bob_deg = bob_deg
+        self.bob_period_ms = bob_period_ms
+        self.calm_ms = calm_ms
+        self.accel_tc = accel_tc
+        self.rng = random.Random(seed)
+        self.regs = bytearray(128)
+        self.power_on()
+
+    def power_on(self):
+        for i in range(len(self.regs)):
+            self.regs[i] = 0
+        self.regs[0x6B] = 0x40  # sleep bit set after power on
+        self.regs[0x75] = 0x68  # WHO_AM_I
+        self.awake_at = None
+        self.clock_start = None  # time (us) of the sample clock_index
+        self.clock_index = 0
+        self.last_sample = -1
+        self.read_sample = -1
+        self.fifo = bytearray()
+        self.fifo_overflow = False
+
+    # --- timing ---
+    def sample_period_us(self):
+        dlpf = self.regs[0x1A] & 7
+        base = 8000 if dlpf in (0, 7) else 1000
+        return 1000000 * (1 + self.regs[0x19]) // base
+
+    def sample_index(self):
+        if self.clock_start is None:
+            return -1
+        elapsed = utime.ticks_diff(utime.ticks_us(), self.clock_start)
+        if elapsed < 0:
+            return -1
+        return self.clock_index + elapsed // self.sample_period_us()
+
+    def sample_time_us(self, index):
+        return self.clock_start + (index - self.clock_index) * self.sample_period_us()
+
+    # --- signal model ---
+    def angle_at(self, t_ms):
+        if not self.bob_deg:
+            return self.tilt, 0.0
+        t_ms %= self.bob_period_ms + self.calm_ms
+        if t_ms >= self.bob_period_ms:
+            return self.tilt, 0.0
+        w = 2 * math.pi / self.bob_period_ms
+        angle = self.tilt + self.bob_deg * math.sin(w * t_ms)
+        rate = self.bob_deg * w * 1000 * math.cos(w * t_ms)  # deg/s
+        return angle, rate
+
+    def noise_g(self):
+        bw = self.BANDWIDTH[self.regs[0x1A] & 7]
+        return self.NOISE_DENSITY * math.sqrt(bw)
+
+    def update_sample(self):
+        index = self.sample_index()
+        if index < 0 or index == self.last_sample:
+            return
+        if self.fifo_enabled():
+            # every sample since the last update is queued, not only the latest one
+            first = max(self.last_sample + 1, index - self.FIFO_SIZE // 6)
+        else:
+            first = index
+        for i in range(first, index + 1):
+            self.generate_sample(i)
+        self.last_sample = index
+
+    def generate_sample(self, index):
+        lsb_per_g = 16384 >> ((self.regs[0x1C] >> 3) & 3)
+        lsb_per_dps = 131.0 / (1 << ((self.regs[0x1B] >> 3) & 3))
+        t_us = self.sample_time_us(index)
+        angle, rate = self.angle_at(t_us // 1000)
+        rad = math.radians(angle)
+        sigma = self.noise_g()
+        drift = [tc * (self.temperature - 25) for tc in self.accel_tc]
+        g = (drift[0] + self.rng.gauss(0, sigma),
+             drift[1] + math.sin(rad) + self.rng.gauss(0, sigma),
+             drift[2] + math.cos(rad) + self.rng.gauss(0, sigma))
+        accel = [int(v * lsb_per_g) for v in g]
+        gyro = [int((rate + self.rng.gauss(0, 0.05)) * lsb_per_dps),
+                int(self.rng.gauss(0, 0.05) * lsb_per_dps),
+                int(self.rng.gauss(0, 0.05) * lsb_per_dps)]
+        temp = int((self.temperature - 35) * 340)
+        for i, val in enumerate(accel + [temp] + gyro):
+            val = max(-32768, min(32767, val)) & 0xFFFF
+            self.regs[0x3B + 2 * i] = val >> 8
+            self.regs[0x3C + 2 * i] = val & 0xFF
+        if self.fifo_enabled() and self.regs[0x23] & 0x08:
+            if len(self.fifo) + 6 > self.FIFO_SIZE:
+                # the oldest bytes are overwritten
+                del self.fifo[:len(self.fifo) + 6 - self.FIFO_SIZE]
+                self.fifo_overflow = True
+            self.fifo += self.regs[0x3B:0x41]
+        self.on_sample()
+
+    def fifo_enabled(self):
+        return bool(self.regs[0x6A] & 0x40)
+
+    def on_sample(self):
+        """
+        Hook called every time a new sample lands in the data registers
+        """
+        pass
+
+    # --- bus access ---
+    def read(self, memaddr, nbytes):
+        self.update_sample()
+        if memaddr == 0x3A:
+            # INT_STATUS, DATA_RDY_INT is cleared on read
+            ready = 1 if self.last_sample > self.read_sample else 0
+            self.read_sample = self.last_sample
+            status = ready | (0x10 if self.fifo_overflow else 0)
+            self.fifo_overflow = False
+            return bytes([status]) + bytes(self.regs[memaddr + 1:memaddr + nbytes])
+        if memaddr == 0x72:
+            count = len(self.fifo)
+            return bytes((count >> 8, count & 0xFF))[:nbytes]
+        if memaddr == 0x74:
+            # FIFO_R_W does not auto-increment, the burst drains the FIFO
+            data = bytes(self.fifo[:nbytes])
+            del self.fifo[:nbytes]
+            return data + bytes(nbytes - len(data))
+        if 0x3B <= memaddr <= 0x48:
+            self.read_sample = self.last_sample
+        return bytes(self.regs[memaddr:memaddr + nbytes])
+
+    def write(self, memaddr, data):
+        # the samples taken so far use the previous configuration
+        self.update_sample()
+        for i, b in enumerate(data):
+            reg = memaddr + i
+            if reg == 0x6B:
+                if b & 0x80:  # DEVICE_RESET
+                    self.power_on()
+                    continue
+                if self.regs[0x6B] & 0x40 and not b & 0x40:
+                    self.awake_at = utime.ticks_us()
+                    self.clock_start = self.awake_at + self.STARTUP_MS * 1000
+                    self.clock_index = self.last_sample + 1
+                elif b & 0x40:
+                    self.awake_at = None
+                    self.clock_start = None
+            if reg in (0x19, 0x1A) and self.sample_index() >= 0 and b != self.regs[reg]:
+                # the sample clock restarts at the new rate
+                self.clock_start = utime.ticks_us()
+                self.clock_index = self.last_sample + 1
+            if reg == 0x6A and b & 0x04:  # FIFO_RESET, self clearing
+                self.fifo = bytearray()
+                self.fifo_overflow = False
+                b &= ~0x04
+            self.regs[reg] = b
+
+
+class FakeDS18B20:
+    """
+    Model of a DS18B20 sitting on the OneWire bus.
+    """
+    CONVERSION_MS = {0x1F: 94, 0x3F: 188, 0x5F: 375, 0x7F: 750}
+
+    def __init__(self, rom, temperature=20.0):
+        self.rom = bytes(rom)
+        self.temperature = temperature
+        self.eeprom = bytearray((0x4B, 0x46, 0x7F))  # TH, TL, config
+        self.power_on()
+
+    def power_on(self):
+        self.scratch = bytearray(9)
+        self.set_raw(0x0550)  # 85 C power-on reset value
+        self.scratch[2:5] = self.eeprom
+        self.scratch[5] = 0xFF
+        self.scratch[6] = 0x0C
+        self.scratch[7] = 0x10
+        self.update_crc()
+        self.converting_until = None
+
+    def set_raw(self, raw):
+        raw &= 0xFFFF
+        self.scratch[0] = raw & 0xFF
+        self.scratch[1] = raw >> 8
+
+    def update_crc(self):
+        self.scratch[8] = crc8(self.scratch[:8])
+
+    def conversion_ms(self):
+        return self.CONVERSION_MS.get(self.scratch[4] & 0x7F, 750)
+
+    def start_conversion(self):
+        self.converting_until = utime.ticks_ms() + self.conversion_ms()
+
+    def busy(self):
+        if self.converting_until is None:
+            return False
+        if utime.ticks_diff(self.converting_until, utime.ticks_ms()) > 0:
+            return True
+        # conversion finished, latch the result with the configured resolution
+        bits = (self.scratch[4] >> 5) & 3
+        raw = int(round(self.temperature * 16))
+        raw &= ~((1 << (3 - bits)) - 1)
+        self.set_raw(raw)
+        self.update_crc()
+        self.converting_until = None
+        return False
+
+
+class FakeAccessPoint:
+    def __init__(self, ssid, password='', bssid=b'\x24\x0a\xc4\x00\x00\x01', channel=6, rssi=-60):
+        self.ssid = ssid
+        self.password = password
+        self.bssid = bssid
+        self.channel = channel
+        self.rssi = rssi
+
+
+class Board:
+    """
+    The whole simulated device: sensors on the buses, access points in range,
+    RTC memory and the latencies of the radio.
+    """
+    SCAN_MS = 1500          # full active scan of all channels
+    ASSOC_MS = 400          # authentication and association
+    DHCP_MS = 900           # DHCP discover/offer/request/ack
+    HTTP_MS = 120           # one HTTP request/response to the fermenter
+
+    def __init__(self):
+        self.reset_cause = PWRON_RESET
+        self.rtc_memory = b''
+        self.battery_adc = 2720
+        self.mpu = FakeMPU6050()
+        self.mpu.on_sample = self.mpu_interrupt
+        self.mpu_int_pin = None  # GPIO wired to the INT pin of the MPU6050, if any
+        self.pin_irqs = {}  # GPIO: (Pin, handler)
+        self.ds18 = [FakeDS18B20(b'\x28\xaa\xec\x01\x19\x13\x02\x38', 19.5)]
+        self.aps = [FakeAccessPoint('Fermenter'), FakeAccessPoint('HomeWiFi', 'secret', b'\x24\x0a\xc4\x00\x00\x02', 11)]
+        self.http_posts = []
+
+    def power_cycle_sensors(self):
+        """
+        The sensors are powered by VPP, which is turned off during deep sleep
+        """
+        self.mpu.power_on()
+        for sensor in self.ds18:
+            sensor.power_on()
+
+    def mpu_interrupt(self):
+        """
+        Data ready pulse of the MPU6050 on its INT pin
+        """
+        irq = self.pin_irqs.get(self.mpu_int_pin)
+        if irq and self.mpu.regs[0x38] & 0x01:
+            pin, handler = irq
+            handler(pin)
+
+    def idle(self):
+        """
+        Move the clock to the next interrupt: the next sample of the MPU6050 if
+        its INT pin triggers an IRQ, else 1 ms later
+        """
+        index = self.mpu.sample_index()
+        if self.mpu_int_pin in self.pin_irqs and index >= 0:
+            utime.advance_us(self.mpu.sample_time_us(index + 1) - utime.ticks_us())
+            self.mpu.update_sample()
+        else:
+            utime.advance_ms(1)
+
+    def find_ap(self, ssid):
+        for ap in self.aps:
+            if ap.ssid == ssid:
+                return ap
+        return None
+
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        for _ in range(8):
+            mix = (crc ^ byte) & 0x01
+            crc >>= 1
+            if mix:
+                crc ^= 0x8C
+            byte >>= 1
+    return crc
+
+
+board = Board()
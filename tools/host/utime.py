@@ -0,0 +1,62 @@
+"""
+CPython stand-in for the MicroPython utime module.
+
+The clock is real time plus a virtual offset: sleep_ms() does not block, it
+moves the clock forward instead.  The simulated hardware in sim.py charges
+its latencies (WiFi association, sensor conversions, bus transfers) to the
+same clock, so a whole wake cycle runs in milliseconds of real time while
+the ticks still report what the device would have spent awake.
+"""
+import time as _time
+
+_offset_us = 0
+_epoch = _time.perf_counter()
+
+
+def advance_us(us):
+    global _offset_us
+    _offset_us += int(us)
+
+
+def advance_ms(ms):
+    advance_us(ms * 1000)
+
+
+def ticks_us():
+    return int((_time.perf_counter() - _epoch) * 1000000) + _offset_us
+
+
+def ticks_ms():
+    return ticks_us() // 1000
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_diff(end, start):
+    return end - start
+
+
+def ticks_add(ticks, delta):
+    return ticks + delta
+
+
+def sleep_us(us):
+    advance_us(us)
+
+
+def sleep_ms(ms):
+    advance_us(ms * 1000)
+
+
+def sleep(sec):
+    advance_us(sec * 1000000)
+
+
+def time():
+    return int(_time.time() + _offset_us / 1000000)
+
+
+def localtime(secs=None):
+    return _time.localtime(secs if secs is not None else time())[:8]
@@ -0,0 +1,159 @@
+"""
+Run the firmware of the hydrometer on CPython.
+
+The MicroPython modules (machine, utime, network, onewire...) are replaced by
+the stand-ins in tools/host, which drive the simulated hardware of sim.py.
+
+Usage:
+    import hostenv
+    fw = hostenv.Firmware()
+    result = fw.boot(hostenv.sim.DEEPSLEEP_RESET)
+"""
+import builtins
+import gc
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import types
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+HOST_DIR = os.path.join(TOOLS_DIR, 'host')
+FIRMWARE_DIR = os.path.join(os.path.dirname(TOOLS_DIR), 'torpedo')
+
+if HOST_DIR not in sys.path:
+    sys.path.insert(0, HOST_DIR)
+# const() is a builtin on MicroPython
+builtins.const = lambda value: value
+# The heap of the ESP32 is not simulated
+if not hasattr(gc, 'mem_free'):
+    gc.mem_free = lambda: 0
+
+import machine  # noqa: E402
+import network  # noqa: E402
+import sim  # noqa: E402
+import utime  # noqa: E402
+
+
+class FakeWebCli:
+    """
+    Replacement of microWebCli.MicroWebCli which posts to sim.board
+    """
+    def __init__(self, url='', method='GET', auth=None, connTimeoutSec=10, socks5Addr=None):
+        self.url = url
+        self.method = method
+
+    def OpenRequestJSONData(self, o=None):
+        utime.advance_ms(sim.board.HTTP_MS)
+        sim.board.http_posts.append((self.url, o))
+
+    def GetResponse(self):
+        return FakeWebCli.Response()
+
+    class Response:
+        def IsSuccess(self):
+            return True
+
+        def GetStatusCode(self):
+            return 200
+
+        def GetStatusMessage(self):
+            return 'OK'
+
+
+class Firmware:
+    """
+    A copy of the torpedo folder in a temporary directory, which plays the
+    role of the flash file system of the ESP32.
+    """
+    def __init__(self, settings=None, workdir=None):
+        self.workdir = workdir or tempfile.mkdtemp(prefix='torpedo-')
+        for name in os.listdir(FIRMWARE_DIR):
+            src = os.path.join(FIRMWARE_DIR, name)
+            if os.path.isfile(src):
+                shutil.copy(src, self.workdir)
+            elif name == 'lib':
+                shutil.copytree(src, os.path.join(self.workdir, name), dirs_exist_ok=True)
+        if settings:
+            self.update_json('user_settings.json', settings)
+
+    def update_json(self, filename, values):
+        import json
+        path = os.path.join(self.workdir, filename)
+        with open(path) as f:
+            data = json.load(f)
+        _merge(data, values)
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        # the firmware recompiles its configuration snapshot when the settings are saved
+        snapshot = os.path.join(self.workdir, 'config.snap')
+        if os.path.exists(snapshot):
+            os.remove(snapshot)
+
+    def _unload_firmware_modules(self):
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, '__file__', None) or ''
+            if path.startswith(self.workdir) or name == 'microWebCli':
+                del sys.modules[name]
+
+    def boot(self, reset_cause):
+        """
+        Run main.py once, as the ESP32 would after a reset
+        :return: tuple; (how the run ended, argument, awake time in ms)
+        """
+        sim.board.reset_cause = reset_cause
+        network.reset()
+        self._unload_firmware_modules()
+        web_cli = types.ModuleType('microWebCli')
+        web_cli.MicroWebCli = FakeWebCli
+        sys.modules['microWebCli'] = web_cli
+        cwd = os.getcwd()
+        os.chdir(self.workdir)
+        sys.path.insert(1, self.workdir)
+        start = utime.ticks_ms()
+        builtin_import = builtins.__import__
+        try:
+            runpy.run_path(os.path.join(self.workdir, 'main.py'), run_name='__main__')
+            outcome, arg = 'returned', None
+        except machine.DeepSleep as e:
+            outcome, arg = 'deepsleep', e.time_ms
+        except machine.Reset:
+            outcome, arg = 'reset', None
+        finally:
+            # the firmware may have wrapped the imports, a reset would undo it
+            builtins.__import__ = builtin_import
+            os.chdir(cwd)
+            sys.path.remove(self.workdir)
+        return outcome, arg, utime.ticks_diff(utime.ticks_ms(), start)
+
+    def module(self, name):
+        """
+        Import a firmware module from the simulated flash, e.g. to inspect the
+        RTC memory between two boots
+        """
+        sys.path.insert(1, self.workdir)
+        try:
+            return __import__(name)
+        finally:
+            sys.path.remove(self.workdir)
+
+    def cleanup(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def _merge(dst, src):
+    for key, value in src.items():
+        if isinstance(value, dict) and isinstance(dst.get(key), dict):
+            _merge(dst[key], value)
+        else:
+            dst[key] = value
+
+
+def quiet():
+    """
+    Context manager silencing the prints of the firmware
+    """
+    import contextlib
+    import io
+    return contextlib.redirect_stdout(io.StringIO())
@@ -0,0 +1,238 @@
+"""
+Replay the register reads recorded by torpedo/imucapture.py through the
+firmware code on CPython, to benchmark the tilt algorithms off the device.
+
+Enable "imuCapture" in the settings, let the hydrometer wake a few times,
+then download the capture in calibration mode (http://192.168.4.1/capture).
+Each session of the capture (one tilt measurement) is fed through a fake I2C
+bus into the real imu.py, vector3d.py and gy521.py.  The accelerometer
+samples of a session, whether read from the data registers or from the FIFO,
+are replayed as one stream timed at the sample rate of the session, so that
+the register and the FIFO algorithms can all run on any session, as long as
+they do not need more samples than were recorded.  The virtual clock of utime
+follows the stream.
+
+Each algorithm is compared with the reference of the session, the mean tilt
+of all its accelerometer samples worked out with floats, and its CPU time
+on the PC is measured (the ESP32 is about two orders of magnitude slower).
+
+Usage:
+    python tools/replay_imu.py imu.cap
+"""
+import json
+import math
+import struct
+import sys
+import time
+from collections import deque
+
+import hostenv
+from hostenv import utime
+
+MAGIC = b'TIC1'
+SESSION = 0xFF
+HEADER = struct.Struct('<IBH')
+INT_STATUS = 0x3A
+ACCEL_OUT = 0x3B
+FIFO_COUNT = 0x72
+FIFO_R_W = 0x74
+
+
+class ReplayEnd(Exception):
+    """
+    The capture has no more reads of a register
+    """
+    pass
+
+
+def load(path):
+    """
+    :return: list; of sessions (info dict, [(ticks_us, register, bytes), ...])
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError('Not an IMU capture: ' + path)
+    sessions = []
+    pos = len(MAGIC)
+    while pos + HEADER.size <= len(data):
+        ticks_us, reg, n = HEADER.unpack_from(data, pos)
+        pos += HEADER.size
+        payload = data[pos:pos + n]
+        pos += n
+        if reg == SESSION:
+            sessions.append((json.loads(payload), []))
+        elif sessions:
+            sessions[-1][1].append((ticks_us, reg, payload))
+    return sessions
+
+
+def accel_samples(frames):
+    """
+    :return: list; of the raw (x, y, z) accelerometer counts read in the session
+    """
+    samples = []
+    for _, reg, data in frames:
+        if reg == ACCEL_OUT and len(data) >= 6:
+            samples.append(struct.unpack_from('>hhh', data))
+        elif reg == FIFO_R_W:
+            samples.extend(struct.unpack_from('>hhh', data, i) for i in range(0, len(data) - 5, 6))
+    return samples
+
+
+class ReplayI2C:
+    """
+    I2C bus answering the reads of the MPU6050 from a capture session.
+    The accelerometer samples of the session come out of the MPU6050 at the
+    sample rate: a read of the data registers waits for the next sample, and
+    the FIFO holds the samples which have come out and have not been read yet.
+    The other registers answer their recorded reads in order, then their power
+    on value.  The polls of the interrupt status depend on the timing of the
+    algorithm, they are not replayed: a sample is always ready.  The writes
+    are kept but not checked.
+    """
+    def __init__(self):
+        self.regs = bytearray(128)
+        self.regs[0x3A] = 0x01  # DATA_RDY_INT
+        self.regs[0x75] = 0x68  # WHO_AM_I
+        self.queues = None
+        self.samples = []  # bytes read from the data registers (from 0x3B), 6 from the FIFO
+        self.taken = 0  # samples read
+        self.start_us = 0
+        self.period_us = 1000
+
+    def play(self, frames, rate_hz):
+        """
+        Answer the next reads from the frames of a session
+        :param rate_hz: int; sample rate of the session
+        """
+        self.queues = {}
+        self.samples = []
+        for _, reg, data in frames:
+            if reg == ACCEL_OUT and len(data) >= 6:
+                self.samples.append(bytes(data))
+            elif reg == FIFO_R_W:
+                self.samples.extend(bytes(data[i:i + 6]) for i in range(0, len(data) - 5, 6))
+            elif reg not in (INT_STATUS, FIFO_COUNT):
+                self.queues.setdefault(reg, deque()).append(data)
+        self.taken = 0
+        self.start_us = utime.ticks_us()
+        self.period_us = 1000000 // rate_hz
+
+    def _next_sample(self):
+        if self.taken >= len(self.samples):
+            raise ReplayEnd('no more accelerometer samples')
+        # wait for the sample to come out
+        late_us = self.start_us + self.taken * self.period_us - utime.ticks_us()
+        if late_us > 0:
+            utime.advance_us(late_us)
+        self.taken += 1
+        return self.samples[self.taken - 1]
+
+    def _fifo_count(self):
+        if self.taken >= len(self.samples):
+            raise ReplayEnd('no more accelerometer samples')
+        out = (utime.ticks_us() - self.start_us) // self.period_us + 1
+        # the FIFO holds 170 samples, the overflow is not replayed
+        return min(min(out, len(self.samples)) - self.taken, 170) * 6
+
+    def scan(self):
+        return [0x68]
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        if self.queues is None:
+            data = self.regs[memaddr:memaddr + len(buf)]
+        elif memaddr == ACCEL_OUT:
+            data = self._next_sample()
+        elif memaddr == FIFO_COUNT:
+            data = self._fifo_count().to_bytes(2, 'big')
+        elif memaddr == FIFO_R_W:
+            data = b''.join(self._next_sample()[:6] for _ in range(len(buf) // 6))
+        elif self.queues.get(memaddr):
+            data = self.queues[memaddr].popleft()
+        else:
+            data = self.regs[memaddr:memaddr + len(buf)]
+        buf[:] = bytes(data[:len(buf)]).ljust(len(buf), b'\0')
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        buf = bytearray(nbytes)
+        self.readfrom_mem_into(addr, memaddr, buf)
+        return bytes(buf)
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self.regs[memaddr:memaddr + len(buf)] = buf
+
+
+def reference_tilt(samples):
+    """
+    Mean of the beta angle of the samples, with floats
+    """
+    angles = [math.degrees(math.atan(y / math.sqrt(x * x + z * z))) for x, y, z in samples if x or z]
+    return sum(angles) / len(angles)
+
+
+# name: (fifo samples, None for the ones of the session; function of the GY521 object returning the tilt)
+ALGORITHMS = {
+    'measure_tilt': (None, lambda gy521: gy521.measure_tilt()[0]),
+    'measure_tilt registers': (0, lambda gy521: gy521.measure_tilt()[0]),
+    'smoothed angles': (None, lambda gy521: gy521.get_smoothed_angles()[1]),
+    'smoothed registers': (0, lambda gy521: gy521.get_smoothed_angles()[1]),
+}
+
+
+def replay(gy521_module, info, frames, fifo_samples, func):
+    """
+    :return: tuple; (tilt, CPU time in us, virtual time in ms)
+    """
+    if fifo_samples is None:
+        # the samples of the data ready interrupt are replayed as register reads
+        fifo_samples = 0 if info.get('irq') else info.get('fifo', 0)
+    bus = ReplayI2C()
+    gy521 = gy521_module.GY521(bus, None, fifo_samples, profile=info.get('profile'))
+    bus.play(frames, gy521.rate_hz)
+    start_ms = utime.ticks_ms()
+    start = time.perf_counter()
+    tilt = func(gy521)
+    cpu_us = (time.perf_counter() - start) * 1e6
+    return tilt, cpu_us, utime.ticks_diff(utime.ticks_ms(), start_ms)
+
+
+def main(path):
+    sessions = [(info, frames) for info, frames in load(path) if accel_samples(frames)]
+    print('%d sessions with accelerometer samples in %s' % (len(sessions), path))
+    if not sessions:
+        return
+    fw = hostenv.Firmware()
+    try:
+        # the modules which gy521 imports lazily
+        for name in ('imu', 'estimator', 'tiltlut'):
+            fw.module(name)
+        gy521_module = fw.module('gy521')
+        print('%-24s %9s %9s %8s %8s %5s' % ('algorithm', 'mean err', 'max err', 'cpu us', 'ms', 'ends'))
+        for name, (fifo_samples, func) in ALGORITHMS.items():
+            errors, cpu, elapsed, ends = [], [], [], 0
+            for info, frames in sessions:
+                reference = reference_tilt(accel_samples(frames))
+                try:
+                    tilt, cpu_us, ms = replay(gy521_module, info, frames, fifo_samples, func)
+                except ReplayEnd:
+                    # the algorithm needs more reads than the capture holds
+                    ends += 1
+                    continue
+                errors.append(abs(tilt - reference))
+                cpu.append(cpu_us)
+                elapsed.append(ms)
+            if not errors:
+                print('%-24s %9s %9s %8s %8s %5d' % (name, '-', '-', '-', '-', ends))
+                continue
+            print('%-24s %9.3f %9.3f %8.0f %8.1f %5d' % (name, sum(errors) / len(errors), max(errors),
+                                                         sum(cpu) / len(cpu), sum(elapsed) / len(elapsed), ends))
+    finally:
+        fw.cleanup()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1])
@@ -0,0 +1,102 @@
+import machine
+import micropython
+import utime
+from array import array
+
+
+class AccelRing:
+    """
+    Sample the accelerometer on the data ready interrupt of the MPU6050.
+    The INT pin of the MPU6050 triggers a pin IRQ, which schedules the read of the
+    raw counts (MPU6050.get_accel_irq) into a preallocated ring. The samples are
+    evenly timed at the sample rate of the MPU6050, and the consumer reads them by
+    batches while the CPU idles in between.
+    The data ready interrupt of the MPU6050 must be enabled (GY521 does it).
+    Usage:
+        ring = AccelRing(imu, 34)
+        ring.start()
+        ring.wait(8, 100)
+        n = ring.read(buf)  # buf: array('h') receiving x, y, z counts of each sample
+        ring.stop()
+    """
+    def __init__(self, imu, int_pin, size=64):
+        """
+        :param imu: MPU6050 object
+        :param int_pin: int; GPIO wired to the INT pin of the MPU6050
+        :param size: int; number of samples kept in the ring
+        """
+        self.imu = imu
+        self.pin = machine.Pin(int_pin, machine.Pin.IN)
+        self.size = size
+        self.ring = array('h', [0] * (3 * size))
+        self.counts = imu.accel.ixyz
+        self.head = 0  # samples written
+        self.tail = 0  # samples read
+        self.lost = 0  # samples overwritten before being read, or dropped by a full schedule queue
+        # bound once, a bound method built in the IRQ handler would allocate
+        self._read_ref = self._read
+
+    def start(self):
+        self.head = 0
+        self.tail = 0
+        self.lost = 0
+        self.imu.data_ready  # clear the pending interrupt
+        self.pin.irq(handler=self._irq, trigger=machine.Pin.IRQ_RISING)
+
+    def stop(self):
+        self.pin.irq(handler=None)
+
+    def _irq(self, pin):
+        # the I2C read can not run in the IRQ handler
+        try:
+            micropython.schedule(self._read_ref, 0)
+        except RuntimeError:
+            self.lost += 1
+
+    def _read(self, _):
+        self.imu.get_accel_irq()
+        counts = self.counts
+        ring = self.ring
+        i = (self.head % self.size) * 3
+        ring[i] = counts[0]
+        ring[i + 1] = counts[1]
+        ring[i + 2] = counts[2]
+        self.head += 1
+        if self.head - self.tail > self.size:
+            # the oldest sample is overwritten
+            self.tail += 1
+            self.lost += 1
+
+    def available(self):
+        return self.head - self.tail
+
+    def wait(self, samples, timeout):
+        """
+        Idle until that many samples are in the ring
+        :param samples: int
+        :param timeout: int; deadline in ms
+        :return: bool; True if the samples have arrived before the deadline
+        """
+        deadline = utime.ticks_add(utime.ticks_ms(), timeout)
+        while self.head - self.tail < samples:
+            if utime.ticks_diff(deadline, utime.ticks_ms()) <= 0:
+                return False
+            machine.idle()
+        return True
+
+    def read(self, buf):
+        """
+        Move the oldest samples of the ring to buf
+        :param buf: array('h'); receives the x, y, z counts of each sample
+        :return: int; number of samples moved
+        """
+        n = min(self.head - self.tail, len(buf) // 3)
+        ring = self.ring
+        for k in range(n):
+            i = ((self.tail + k) % self.size) * 3
+            j = k * 3
+            buf[j] = ring[i]
+            buf[j + 1] = ring[i + 1]
+            buf[j + 2] = ring[i + 2]
+        self.tail += n
+        return n
@@ -0,0 +1,105 @@
+import ujson
+import utime
+
+
+class ReadingBatch:
+    """
+    Store-and-forward buffer of the working mode readings, kept in the RTC memory.
+    The readings are queued at every wake, and the radio is only brought up to
+    flush the whole batch every Nth wake, or when the gravity has changed by more
+    than a threshold since the last flush.
+    The batch is also flushed when it is about to outgrow MAX_BYTES, and the
+    oldest readings are dropped beyond that, e.g. while the server is down.
+    """
+    STORE_KEY = 'batch'
+    # Share of the 2048 bytes of the RTC memory (JSON of the readings).  The rest of the state takes about 700 bytes
+    # at most: WiFi cache ~150, SG history of the scheduler ~270, DS18 ROM codes ~25 per probe, the boot mode and the
+    # next interval, plus the keys.  The diagnostics (timing, imports) are dropped by RTCStore.save() if they do not fit
+    MAX_BYTES = 1024
+
+    def __init__(self, rtc_store, size=6, sg_delta=0.002):
+        """
+        :param rtc_store: RTCStore object
+        :param size: int; number of readings to collect before a flush
+        :param sg_delta: float; flush immediately if the SG has changed more than that since the last flush
+        """
+        self.rtc_store = rtc_store
+        self.size = max(int(size), 1)
+        self.sg_delta = sg_delta
+        state = rtc_store.get(self.STORE_KEY) or {}
+        self.readings = state.get('r', [])  # [time, tilt, sg, plato, temperature, battery(, [temperatures])]
+        self.last_sg = state.get('sg')  # SG of the last flushed reading
+        self.labels = state.get('l', [])  # labels of the DS18 probes, in the order of the temperatures
+
+    def _save(self):
+        self.rtc_store.set(self.STORE_KEY, {'r': self.readings, 'sg': self.last_sg, 'l': self.labels})
+
+    def room(self):
+        """
+        Number of readings like the last one that still fit in MAX_BYTES
+        """
+        if not self.readings:
+            return self.size
+        used = len(ujson.dumps(self.readings))
+        return (self.MAX_BYTES - used) // (len(ujson.dumps(self.readings[-1])) + 1)
+
+    def is_due(self):
+        """
+        Return True if the reading of this wake will fill the batch
+        """
+        return self.last_sg is None or len(self.readings) + 1 >= self.size or self.room() <= 1
+
+    def append(self, tilt, sg, plato, temp, battery, temps=None):
+        """
+        :param temps: dict; temperature of each DS18 probe by label, only kept if there are several probes
+        """
+        reading = [utime.time(), tilt, sg, plato, temp, battery]
+        if temps:
+            # the labels are kept once for the batch, the readings only hold the temperatures
+            labels = sorted(temps)
+            if labels != self.labels:
+                # the probes have changed, the earlier temperatures can not be labeled anymore
+                self.readings = [r[:6] for r in self.readings]
+                self.labels = labels
+            reading.append([temps[label] for label in labels])
+        self.readings.append(reading)
+        while len(self.readings) > 1 and len(ujson.dumps(self.readings)) > self.MAX_BYTES:
+            self.readings.pop(0)
+        self._save()
+
+    def should_flush(self):
+        """
+        Return True if the batch is full, or if the last reading has moved away from the last flushed SG
+        """
+        if not self.readings:
+            return False
+        if self.last_sg is None or len(self.readings) >= self.size or self.room() < 1:
+            return True
+        return abs(self.readings[-1][2] - self.last_sg) >= self.sg_delta
+
+    def get_readings(self):
+        """
+        Return the queued readings, oldest first
+        :return: list; of dict with the age of the reading in seconds
+        """
+        now = utime.time()
+        readings = []
+        for r in self.readings:
+            reading = {'ageSec': now - r[0], 'angle': r[1], 'sg': r[2], 'plato': r[3], 'temperature': r[4],
+                       'battery': r[5]}
+            if len(r) > 6:
+                reading['temperatures'] = dict(zip(self.labels, r[6]))
+            readings.append(reading)
+        return readings
+
+    def clear(self):
+        """
+        Empty the batch once it has been sent
+        """
+        if self.readings:
+            self.last_sg = self.readings[-1][2]
+        self.readings = []
+        self._save()
+
+    def count(self):
+        return len(self.readings)
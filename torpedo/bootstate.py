@@ -0,0 +1,73 @@
+import uos
+
+
+class BootState:
+    """
+    Mode the hydrometer boots into after a soft reset, kept in the RTC memory.
+    The mode used to be told by trigger files on the flash, which cost a flash
+    write and an extra reboot at every wake. The trigger files are now only
+    written when the mode changes, and are read back only if the RTC memory
+    has been lost (e.g. firmware without RTC memory retention across resets).
+    """
+    STORE_KEY = 'mode'
+    CALIBRATION = 'cal'
+    FIRST_SLEEP = 'first'
+    WORKING = 'work'
+    FTP = 'ftp'
+
+    def __init__(self, rtc_store, hardware_config):
+        """
+        :param rtc_store: RTCStore object
+        :param hardware_config: dict; the content of hardware_config.json, for the names of the trigger files
+        """
+        self.rtc_store = rtc_store
+        self.triggers = {
+            self.FIRST_SLEEP: hardware_config['firstsleep_trigger'],
+            self.WORKING: hardware_config['deepsleep_trigger'],
+            self.FTP: hardware_config['ftp_trigger']
+        }
+
+    def get(self):
+        """
+        :return: str; the current mode, CALIBRATION if none has been set
+        """
+        mode = self.rtc_store.get(self.STORE_KEY)
+        if mode is None:
+            mode = self._read_triggers()
+            self.rtc_store.set(self.STORE_KEY, mode)
+        return mode
+
+    def set(self, mode):
+        """
+        Switch to another mode; the RTC memory is saved right away since a reset or a deep sleep usually follows
+        """
+        if mode == self.rtc_store.get(self.STORE_KEY):
+            return
+        self.rtc_store.set(self.STORE_KEY, mode)
+        self.rtc_store.save()
+        self._write_triggers(mode)
+
+    def reset(self):
+        """
+        Forget the mode at power on, the next soft reset enters the calibration mode
+        """
+        self.rtc_store.clear()
+        self.rtc_store.set(self.STORE_KEY, self.CALIBRATION)
+        self.rtc_store.save()
+        self._write_triggers(self.CALIBRATION)
+
+    def _read_triggers(self):
+        files = uos.listdir()
+        for mode in (self.FIRST_SLEEP, self.WORKING, self.FTP):
+            if self.triggers[mode] in files:
+                return mode
+        return self.CALIBRATION
+
+    def _write_triggers(self, mode):
+        files = uos.listdir()
+        for trigger_mode, trigger in self.triggers.items():
+            if trigger_mode != mode and trigger in files:
+                uos.remove(trigger)
+        if mode in self.triggers and self.triggers[mode] not in files:
+            with open(self.triggers[mode], 'w') as f:
+                pass
@@ -0,0 +1,182 @@
+import ujson
+import uos
+import ustruct
+
+MAGIC = b'TCS2'
+SNAPSHOT_FILE = 'config.snap'
+# section name: source JSON file
+SOURCES = (
+    ('hardware', 'hardware_config.json'),
+    ('settings', 'user_settings.json'),
+    ('regression', 'regression.json')
+)
+
+
+def _encode(value, out):
+    if value is None:
+        out.append(b'N')
+    elif value is True:
+        out.append(b'T')
+    elif value is False:
+        out.append(b'F')
+    elif isinstance(value, int):
+        out.append(b'i' + ustruct.pack('<i', value))
+    elif isinstance(value, float):
+        out.append(b'd' + ustruct.pack('<d', value))
+    elif isinstance(value, str):
+        data = value.encode()
+        out.append(b's' + ustruct.pack('<H', len(data)) + data)
+    elif isinstance(value, (list, tuple)):
+        out.append(b'l' + ustruct.pack('<H', len(value)))
+        for item in value:
+            _encode(item, out)
+    elif isinstance(value, dict):
+        out.append(b'm' + ustruct.pack('<H', len(value)))
+        for key, item in value.items():
+            data = key.encode()
+            out.append(ustruct.pack('<H', len(data)) + data)
+            _encode(item, out)
+    else:
+        raise ValueError('Unsupported type in the configuration: ' + str(type(value)))
+
+
+def _decode(buf, pos):
+    """
+    :return: tuple; (value, position of the next value)
+    """
+    tag = buf[pos]
+    pos += 1
+    if tag == 0x4e:  # N
+        return None, pos
+    if tag == 0x54:  # T
+        return True, pos
+    if tag == 0x46:  # F
+        return False, pos
+    if tag == 0x69:  # i
+        return ustruct.unpack_from('<i', buf, pos)[0], pos + 4
+    if tag == 0x64:  # d
+        return ustruct.unpack_from('<d', buf, pos)[0], pos + 8
+    if tag == 0x73:  # s
+        size = ustruct.unpack_from('<H', buf, pos)[0]
+        pos += 2
+        return str(buf[pos:pos + size], 'utf8'), pos + size
+    count = ustruct.unpack_from('<H', buf, pos)[0]
+    pos += 2
+    if tag == 0x6c:  # l
+        items = []
+        for _ in range(count):
+            item, pos = _decode(buf, pos)
+            items.append(item)
+        return items, pos
+    if tag == 0x6d:  # m
+        items = {}
+        for _ in range(count):
+            size = ustruct.unpack_from('<H', buf, pos)[0]
+            pos += 2
+            key = str(buf[pos:pos + size], 'utf8')
+            items[key], pos = _decode(buf, pos + size)
+        return items, pos
+    raise ValueError('Corrupted configuration snapshot')
+
+
+def _stamp(filename):
+    """
+    :return: tuple; (size, mtime) of the file, (0, 0) if it does not exist
+    """
+    try:
+        st = uos.stat(filename)
+    except OSError:
+        return 0, 0
+    return st[6] & 0xFFFFFFFF, st[8] & 0xFFFFFFFF
+
+
+def compile_snapshot(path=SNAPSHOT_FILE):
+    """
+    Compile the JSON configuration files into a binary snapshot.
+    The size and the modification time of each file are kept in the header,
+    so that ConfigSnapshot compiles it again when a file has changed.
+    """
+    sections = []
+    for name, filename in SOURCES:
+        try:
+            with open(filename, 'r') as f:
+                value = ujson.load(f)
+        except OSError:
+            value = {}
+        out = []
+        _encode(value, out)
+        sections.append((name.encode(), b''.join(out)))
+    # header: magic, section count, then name, offset and size of each section, size and mtime of its source
+    header_size = len(MAGIC) + 1 + sum(1 + len(name) + 12 for name, _ in sections)
+    header = [MAGIC, bytes([len(sections)])]
+    offset = header_size
+    for (name, data), (_, filename) in zip(sections, SOURCES):
+        header.append(bytes([len(name)]) + name + ustruct.pack('<HHII', offset, len(data), *_stamp(filename)))
+        offset += len(data)
+    with open(path, 'wb') as f:
+        f.write(b''.join(header))
+        for _, data in sections:
+            f.write(data)
+    print('Configuration snapshot "' + path + '" has been compiled')
+
+
+def invalidate_snapshot(path=SNAPSHOT_FILE):
+    """
+    Delete the snapshot, the next boot compiles it again
+    """
+    try:
+        uos.remove(path)
+    except OSError:
+        pass
+
+
+class ConfigSnapshot:
+    """
+    Read the configuration from the binary snapshot compiled by compile_snapshot().
+    Only the header is read when opening; each section is read and decoded on
+    first access, so a boot path only pays for the sections it uses, and no
+    JSON is parsed on the boot path.  The snapshot is compiled again if one of
+    the JSON files has changed since (e.g. copied over FTP or by mpremote).
+    """
+    def __init__(self, path=SNAPSHOT_FILE):
+        self.path = path
+        self.index = {}  # name: (offset, size)
+        self.cache = {}
+        if not self._read_index():
+            compile_snapshot(path)
+            self._read_index()
+
+    def _read_index(self):
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.read(256)
+        except OSError:
+            return False
+        if not header.startswith(MAGIC):
+            return False
+        sources = dict(SOURCES)
+        pos = len(MAGIC) + 1
+        for _ in range(header[len(MAGIC)]):
+            size = header[pos]
+            name = str(header[pos + 1:pos + 1 + size], 'utf8')
+            pos += 1 + size
+            offset, length, file_size, mtime = ustruct.unpack_from('<HHII', header, pos)
+            pos += 12
+            if name not in sources or (file_size, mtime) != _stamp(sources[name]):
+                self.index = {}
+                return False
+            self.index[name] = (offset, length)
+        return True
+
+    def section(self, name):
+        """
+        :param name: str; 'hardware', 'settings' or 'regression'
+        :return: dict; the content of the JSON file the section has been compiled from
+        """
+        if name not in self.cache:
+            offset, size = self.index[name]
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                buf = f.read(size)
+            self.cache[name] = _decode(buf, 0)[0]
+        return self.cache[name]
@@ -0,0 +1,102 @@
+import math
+from array import array
+
+
+class StreamingEstimator:
+    """
+    Estimate a value from noisy samples as they arrive.
+    The mean and variance are updated with Welford's algorithm, and the last
+    samples are kept in a preallocated ring for the trimmed mean and the median,
+    so that sampling can stop as soon as the estimate is precise enough.
+    Usage:
+        est = StreamingEstimator(32)
+        while not est.converged(5):
+            est.add(read_sample())
+        value, std = est.trimmed_mean(), est.std()
+    """
+    def __init__(self, size=32, trim=1):
+        """
+        :param size: int; number of samples kept in the ring
+        :param trim: int; number of samples dropped at each end for the trimmed mean
+        """
+        self.ring = array('l', [0] * size)
+        self.trim = trim
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        """
+        :param value: int; e.g. a tilt angle in centidegrees
+        """
+        self.ring[self.count % len(self.ring)] = value
+        self.count += 1
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+
+    def mean(self):
+        return self._mean
+
+    def std(self):
+        """
+        Standard deviation of the samples
+        """
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self._m2 / (self.count - 1))
+
+    def std_error(self):
+        """
+        Standard error of the mean. The samples are taken as independent, which
+        holds as long as the sample rate is below twice the filter bandwidth.
+        """
+        if self.count < 2:
+            return None
+        return self.std() / math.sqrt(self.count)
+
+    def converged(self, tolerance, min_samples=8):
+        """
+        Return True once the standard error of the mean is within the tolerance
+        :param tolerance: float; in the unit of the samples
+        """
+        if self.count < max(min_samples, 2):
+            return False
+        return self.std_error() <= tolerance
+
+    def window_std(self):
+        """
+        Standard deviation of the samples of the ring only
+        """
+        n = min(self.count, len(self.ring))
+        if n < 2:
+            return 0.0
+        mean = sum(self.ring[:n]) / n
+        return math.sqrt(sum((v - mean) ** 2 for v in self.ring[:n]) / (n - 1))
+
+    def _window(self):
+        n = min(self.count, len(self.ring))
+        return sorted(self.ring[:n])
+
+    def trimmed_mean(self):
+        """
+        Mean of the samples of the ring, without the `trim` lowest and highest ones
+        """
+        window = self._window()
+        if len(window) > 2 * self.trim + 2:
+            window = window[self.trim:len(window) - self.trim]
+        if not window:
+            return None
+        return sum(window) / len(window)
+
+    def median(self):
+        window = self._window()
+        if not window:
+            return None
+        mid = len(window) // 2
+        if len(window) % 2:
+            return window[mid]
+        return (window[mid - 1] + window[mid]) / 2
@@ -1,15 +1,115 @@
 import math
 import utime
+from array import array
+from ustruct import unpack_from
+from ready import wait_until
 
 
 class GY521:
-    def __init__(self, sda_pin, scl_pin):
+    FIFO_RATE_HZ = 1000  # the accelerometer output rate
+    FIFO_CHUNK = 8  # samples drained at once when streaming from the FIFO
+    CACHE_KEY = 'imu'
+    # acquisition profiles: (DLPF setting, sample rate in Hz, accelerometer range)
+    # the sample rate is 2.5 to 5 times the bandwidth of the DLPF, the samples are then nearly independent
+    PROFILES = {
+        'fast': (1, 500, 1),  # 184 Hz, +/-4g: quick response while handled during the calibration
+        'balanced': (3, 200, 0),  # 44 Hz, +/-2g
+        'precise': (5, 50, 0),  # 10 Hz, +/-2g: lowest noise per sample
+    }
+
+    def __init__(self, sda_pin, scl_pin, fifo_samples=0, rtc_store=None, profile=None, int_pin=None, temp_comp=None):
+        """
+        :param fifo_samples: int; if not 0, get_smoothed_angles() drains that many samples
+            from the FIFO of the MPU6050 in one I2C burst, instead of reading the registers once per sample
+        :param rtc_store: RTCStore object; if given, the address of the MPU6050 is cached in the RTC memory,
+            so that after a deep sleep it is brought up without the bus scan and the settle delay
+        :param profile: str; one of PROFILES, None to keep the unfiltered sampling at FIFO_RATE_HZ
+        :param int_pin: int; GPIO wired to the INT pin of the MPU6050. If given, the samples are read
+            on the data ready interrupt into a ring (see accelring.py), rather than from the FIFO
+        :param temp_comp: dict; model of the accelerometer offsets against the die temperature (see tempcomp.py)
+        """
         from imu import MPU6050
         # See instruction: https://github.com/micropython-IMU/micropython-mpu9x50/blob/master/README_MPU9150.md
         # already modified for esp32(sda=21, scl=22)/wemos D1 mini(sda=4, scl=5)
-        self.imu = MPU6050(sda=sda_pin, scl=scl_pin)
+        cache = rtc_store.get(self.CACHE_KEY) if rtc_store is not None else None
+        self.imu = None
+        if cache:
+            try:
+                self.imu = MPU6050(sda=sda_pin, scl=scl_pin, device_addr=cache['dev'], fast=True)
+            except OSError as e:
+                print('GY521 fast init failed: ' + str(e))
+                rtc_store.remove(self.CACHE_KEY)
+        if self.imu is None:
+            self.imu = MPU6050(sda=sda_pin, scl=scl_pin)
+            if rtc_store is not None:
+                rtc_store.set(self.CACHE_KEY, {'dev': MPU6050._mpu_addr.index(self.imu.mpu_addr)})
         self.measured_angles = None
-        utime.sleep_ms(500)  # allow stablization of the module
+        self.temp_comp = temp_comp
+        self.offsets = (0, 0, 0)  # accelerometer offsets in counts at the die temperature of the last burst
+        self.burst = None  # (die temperature, x, y, z counts) of the last burst
+        self.burst_counts = array('h', [0, 0, 0])  # counts of the last burst, without the offsets
+        self.fifo_samples = min(fifo_samples, 170)  # the FIFO holds 170 accelerometer samples
+        self.fifo_buf = bytearray(6 * self.fifo_samples)
+        self.profile = None
+        self.rate_hz = self.FIFO_RATE_HZ
+        if profile:
+            self.set_profile(profile)
+        elif self.fifo_samples:
+            # queue the samples at the accelerometer output rate, the base rate depends on the DLPF
+            base_hz = 8000 if self.imu.filter_range in (0, 7) else 1000
+            self.imu.sample_rate = base_hz // self.FIFO_RATE_HZ - 1
+        self.ring = None
+        if int_pin is not None:
+            from accelring import AccelRing
+            self.ring = AccelRing(self.imu, int_pin)
+            self.ring_buf = array('h', [0] * (3 * self.FIFO_CHUNK))
+        # wait for the first sample instead of a fixed stabilization delay
+        self.imu.data_ready_int = True
+        if not wait_until(lambda: self.imu.data_ready, 500):
+            print('GY521 data not ready')
+
+    def set_profile(self, name):
+        """Set the DLPF, the sample rate and the accelerometer range of an acquisition profile
+
+        Arguments:
+            name {str} -- ['fast', 'balanced' or 'precise']
+        """
+        try:
+            filt, rate_hz, accel_range = self.PROFILES[name]
+        except KeyError:
+            raise ValueError('Unknown GY521 profile: ' + str(name))
+        self.imu.filter_range = filt
+        # the base rate depends on the DLPF
+        base_hz = 8000 if filt in (0, 7) else 1000
+        self.imu.sample_rate = base_hz // rate_hz - 1
+        self.imu.accel_range = accel_range
+        self.profile = name
+        self.rate_hz = rate_hz
+
+    def read_burst(self):
+        """Read the accelerometer and the die temperature in one burst, and work out the accelerometer offsets
+        of that temperature. The offsets are then removed from the samples until the next burst.
+
+        Returns:
+            [array] -- [the accelerometer counts of the burst, without the offsets]
+        """
+        temp = self.imu.read_motion()
+        raw = self.imu.accel.ixyz
+        self.burst = (temp, raw[0], raw[1], raw[2])
+        # the counts of the driver are left raw for its other readers
+        counts = self.burst_counts
+        counts[0] = raw[0]
+        counts[1] = raw[1]
+        counts[2] = raw[2]
+        if self.temp_comp:
+            lsb_per_g = 1 / self.imu._accel_scale
+            dt = temp - self.temp_comp['t0']
+            k = self.temp_comp['k']
+            self.offsets = (int(k[0] * dt * lsb_per_g), int(k[1] * dt * lsb_per_g), int(k[2] * dt * lsb_per_g))
+            counts[0] -= self.offsets[0]
+            counts[1] -= self.offsets[1]
+            counts[2] -= self.offsets[2]
+        return counts
 
     def get_tilt_angles(self):
         """Export tilt angles in degree
@@ -21,6 +121,17 @@ class GY521:
         """
         # read accel data from axis x, y, z
         ax, ay, az = self.imu.accel.xyz
+        ox, oy, oz = self.offsets
+        scale = self.imu._accel_scale
+        return self.accel_to_angles(ax - ox * scale, ay - oy * scale, az - oz * scale)
+
+    @staticmethod
+    def accel_to_angles(ax, ay, az):
+        """Tilt angles in degree of an accelerometer sample, in g or in raw counts
+
+        Returns:
+            [tuple] -- [the tilt angles in degree for 3 axis]
+        """
         # https://www.cnblogs.com/21207-iHome/p/6059260.html
         # pitch angle (angle between x axis and level surface)
         alpha = round(math.atan(ax / math.sqrt(ay**2 + az**2)) * 180 / math.pi, 2)
@@ -30,24 +141,75 @@ class GY521:
         gamma = round(math.atan(math.sqrt(ax**2 + ay**2) / az) * 180 / math.pi, 2)
         return alpha, beta, gamma
 
+    def read_fifo(self):
+        """Let the MPU6050 queue fifo_samples samples in its FIFO, then drain them into fifo_buf in one I2C burst
+
+        Returns:
+            [int] -- [number of samples read, 0 if the FIFO has overflowed]
+        """
+        self.imu.fifo_start()
+        utime.sleep_ms(self.fifo_samples * 1000 // self.rate_hz)
+        expected = len(self.fifo_buf)
+        wait_until(lambda: self.imu.fifo_count >= expected, 50, poll_ms=2)
+        n = self.imu.read_fifo(self.fifo_buf)
+        self.imu.fifo_stop()
+        return n
+
+    def get_fifo_angles(self):
+        """Sample the tilt angles through the FIFO
+
+        The angles do not depend on the accelerometer range, so the raw counts are used as they are.
+
+        Returns:
+            [list] -- [the tilt angles of each sample]
+        """
+        n = self.read_fifo()
+        buf = self.fifo_buf
+        ox, oy, oz = self.offsets
+        angles = []
+        for i in range(0, n * 6, 6):
+            ax, ay, az = unpack_from('>hhh', buf, i)
+            angles.append(self.accel_to_angles(ax - ox, ay - oy, az - oz))
+        return angles
+
+    def get_ring_angles(self, samples):
+        """Sample the tilt angles on the data ready interrupt
+
+        Returns:
+            [list] -- [the tilt angles of each sample, fewer than samples if the interrupts stop coming]
+        """
+        buf = array('h', [0] * (3 * samples))
+        self.ring.start()
+        self.ring.wait(samples, samples * 2000 // self.rate_hz + 50)
+        n = self.ring.read(buf)
+        self.ring.stop()
+        ox, oy, oz = self.offsets
+        return [self.accel_to_angles(buf[i] - ox, buf[i + 1] - oy, buf[i + 2] - oz) for i in range(0, n * 3, 3)]
+
     def get_smoothed_angles(self, samples=5):
         """Calculate smoothed tilt angles
         
         Keyword Arguments:
-            sec {int} -- [duration smoothed in seconds] (default: {3})
+            samples {int} -- [number of samples, fifo_samples in FIFO mode] (default: {5})
         
         Returns:
             [tuple] -- [smoothed tilt angles for 3 axis, unit is degree]
         """
         if isinstance(samples, int):
-            a = []
-            b = []
-            c = []
-            for _ in range(samples):
-                x, y, z = self.get_tilt_angles()
-                a.append(x)
-                b.append(y)
-                c.append(z)
+            # only for the die temperature and the offsets
+            self.read_burst()
+            if self.ring is not None:
+                readings = self.get_ring_angles(samples)
+            elif self.fifo_samples:
+                readings = self.get_fifo_angles()
+            else:
+                readings = [self.get_tilt_angles() for _ in range(samples)]
+            if not readings:
+                # FIFO overflow or no interrupt, fall back to register reads
+                readings = [self.get_tilt_angles() for _ in range(samples)]
+            a = [r[0] for r in readings]
+            b = [r[1] for r in readings]
+            c = [r[2] for r in readings]
 
             def calc_avg(li):
                 if len(li) > 4:
@@ -62,6 +224,143 @@ class GY521:
             self.measured_angles = alpha_avg, beta_avg, gamma_avg
             return self.measured_angles
 
+    def measure_tilt(self, axis=1, tolerance=0.05, min_samples=8, max_samples=32):
+        """Measure the tilt angle of one axis, until the estimate has converged
+
+        The samples are fed to a streaming estimator as they arrive, by chunks from the ring of the data
+        ready interrupt or from the FIFO, or from the registers, and the sampling stops as soon as the
+        standard error of the mean is within the tolerance. The angles are worked out from the raw
+        accelerometer counts with integer math (see tiltlut.py), only the final estimate is a float.
+
+        Keyword Arguments:
+            axis {int} -- [0 for alpha, 1 for beta, 2 for gamma] (default: {1})
+            tolerance {float} -- [standard error of the mean to reach, unit is degree] (default: {0.05})
+            min_samples {int} -- [number of samples taken at least] (default: {8})
+            max_samples {int} -- [number of samples taken at most, fifo_samples in FIFO mode] (default: {32})
+
+        Returns:
+            [tuple] -- [trimmed mean of the tilt angle and standard deviation of the samples, unit is degree]
+        """
+        from estimator import StreamingEstimator
+        from tiltlut import tilt_cdeg
+        tolerance *= 100  # the estimator works in centidegrees
+        if self.fifo_samples and self.ring is None:
+            max_samples = self.fifo_samples
+        est = StreamingEstimator(max_samples)
+        # the burst gives the die temperature, hence the offsets, and the first sample
+        counts = self.read_burst()
+        ox, oy, oz = self.offsets
+        est.add(tilt_cdeg(axis, counts[0], counts[1], counts[2]))
+        if self.ring is not None:
+            buf = self.ring_buf
+            deadline = utime.ticks_add(utime.ticks_ms(), 2 * max_samples * 1000 // self.rate_hz + 50)
+            self.ring.start()
+            while est.count < max_samples and not est.converged(tolerance, min_samples):
+                chunk = min(self.FIFO_CHUNK, max_samples - est.count)
+                if not self.ring.wait(chunk, utime.ticks_diff(deadline, utime.ticks_ms())):
+                    break
+                n = self.ring.read(memoryview(buf)[:3 * chunk])
+                for i in range(0, n * 3, 3):
+                    est.add(tilt_cdeg(axis, buf[i] - ox, buf[i + 1] - oy, buf[i + 2] - oz))
+            self.ring.stop()
+        elif self.fifo_samples:
+            buf = self.fifo_buf
+            chunk_ms = self.FIFO_CHUNK * 1000 // self.rate_hz
+            deadline = utime.ticks_add(utime.ticks_ms(), 2 * max_samples * 1000 // self.rate_hz + 50)
+            self.imu.fifo_start()
+            while est.count < max_samples and not est.converged(tolerance, min_samples):
+                if utime.ticks_diff(deadline, utime.ticks_ms()) < 0:
+                    break
+                utime.sleep_ms(chunk_ms)
+                n = self.imu.read_fifo(memoryview(buf)[:6 * (max_samples - est.count)])
+                for i in range(0, n * 6, 6):
+                    ax, ay, az = unpack_from('>hhh', buf, i)
+                    est.add(tilt_cdeg(axis, ax - ox, ay - oy, az - oz))
+            self.imu.fifo_stop()
+        if est.count == 1:
+            # no sample streamed, read the registers
+            counts = self.imu.accel.ixyz
+            period_ms = 1000 // self.rate_hz
+            ready = lambda: self.imu.data_ready
+            while est.count < max_samples and not est.converged(tolerance, min_samples):
+                if period_ms:
+                    # a filtered profile samples slower than the registers can be read
+                    wait_until(ready, 2 * period_ms, poll_ms=1)
+                self.imu.get_accel_irq()
+                est.add(tilt_cdeg(axis, counts[0] - ox, counts[1] - oy, counts[2] - oz))
+        return round(est.trimmed_mean() / 100, 2), round(est.std() / 100, 3)
+
+    def measure_still_tilt(self, axis=1, gyro_dps=2.0, accel_std=0.3, window=16, period_ms=None, timeout_ms=2000):
+        """Measure the tilt angle of one axis once the hydrometer has stopped bobbing
+
+        Accelerometer and gyro are read together every period_ms, at most once per sample of the
+        MPU6050. The hydrometer is taken as still once, over the last `window` samples, the angular rate
+        of every axis has varied less than gyro_dps (so the offset of the gyro does not matter) and the
+        standard deviation of the tilt is within accel_std. The tilt is then the trimmed mean of those
+        samples. If it does not settle before the deadline, the window with the lowest standard
+        deviation is used.
+
+        Keyword Arguments:
+            axis {int} -- [0 for alpha, 1 for beta, 2 for gamma] (default: {1})
+            gyro_dps {float} -- [variation of the angular rate allowed, unit is degree/s] (default: {2.0})
+            accel_std {float} -- [standard deviation of the tilt allowed, unit is degree] (default: {0.3})
+            window {int} -- [number of samples of the still window] (default: {16})
+            period_ms {int} -- [sampling period, None for the sample period of the profile, 10 ms at least]
+                (default: {None})
+            timeout_ms {int} -- [deadline] (default: {2000})
+
+        Returns:
+            [tuple] -- [tilt angle and its standard deviation, unit is degree; True if still]
+        """
+        from estimator import StreamingEstimator
+        from tiltlut import tilt_cdeg
+        est = StreamingEstimator(window)
+        rates = array('h', [0] * (3 * window))
+        gyro_lsb = gyro_dps / self.imu._gyro_scale
+        accel_std *= 100  # the estimator works in centidegrees
+        accel = self.imu.accel.ixyz
+        gyro = self.imu.gyro.ixyz
+        best = None  # (std, tilt) of the quietest window
+        still = False
+        if period_ms is None:
+            period_ms = max(1000 // self.rate_hz, 10)
+        self.read_burst()
+        ox, oy, oz = self.offsets
+        deadline = utime.ticks_add(utime.ticks_ms(), timeout_ms)
+        while True:
+            self.imu.read_motion()
+            i = (est.count % window) * 3
+            rates[i] = gyro[0]
+            rates[i + 1] = gyro[1]
+            rates[i + 2] = gyro[2]
+            est.add(tilt_cdeg(axis, accel[0] - ox, accel[1] - oy, accel[2] - oz))
+            if est.count >= window:
+                std = est.window_std()
+                if best is None or std < best[0]:
+                    best = (std, est.trimmed_mean())
+                if std <= accel_std:
+                    variation = 0
+                    for a in range(3):
+                        # MicroPython only slices arrays with a step of 1
+                        low = high = rates[a]
+                        for j in range(a + 3, 3 * window, 3):
+                            v = rates[j]
+                            if v < low:
+                                low = v
+                            elif v > high:
+                                high = v
+                        variation = max(variation, high - low)
+                    if variation <= gyro_lsb:
+                        best = (std, est.trimmed_mean())
+                        still = True
+                        break
+            if utime.ticks_diff(deadline, utime.ticks_ms()) <= 0:
+                break
+            utime.sleep_ms(period_ms)
+        if best is None:
+            best = (est.window_std(), est.trimmed_mean())
+        return round(best[1] / 100, 2), round(best[0] / 100, 3), still
+
     def read_angles(self):
         if not self.measured_angles:
             return self.get_smoothed_angles()
@@ -1,19 +1,33 @@
 from microWebSrv import MicroWebSrv
 import machine
 import ujson
+import uos
+from configsnap import compile_snapshot
+
+
+def load_regression():
+    try:
+        with open('regression.json', 'r') as f:
+            return ujson.load(f)
+    except (OSError, ValueError):
+        return {}
 
 
 class HttpServer:
-    def __init__(self, gy521_obj, wifi_obj, user_settings_dict):
+    def __init__(self, gy521_obj, wifi_obj, user_settings_dict, boot_state_obj, import_profiler=None):
         self.gy521 = gy521_obj
         self.wifi = wifi_obj
         self.settings = user_settings_dict
+        self.boot_state = boot_state_obj
+        self.import_profiler = import_profiler
         self.app = None
 
     def start(self):
         gy521 = self.gy521
         wifi = self.wifi
         settings = self.settings
+        boot_state = self.boot_state
+        import_profiler = self.import_profiler
 
         @MicroWebSrv.route('/connecttest')
         def test_get(httpClient, httpResponse):
@@ -42,8 +56,14 @@ class HttpServer:
             """
             result = httpClient.ReadRequestContentAsJSON()
             try:
+                # the temperature compensation is kept with the calibration data, but fitted on its own
+                if 'tempComp' not in result:
+                    temp_comp = load_regression().get('tempComp')
+                    if temp_comp:
+                        result['tempComp'] = temp_comp
                 with open('regression.json', 'w') as f:
                     ujson.dump(result, f)
+                compile_snapshot()
             except:
                 # throw 500 error code
                 httpResponse.WriteResponseInternalServerError()
@@ -63,6 +83,56 @@ class HttpServer:
             else:
                 httpResponse.WriteResponseJSONOk(obj={'params': params}, headers=None)
 
+        @MicroWebSrv.route('/tempcomp')
+        def tempcomp_get(httpClient, httpResponse):
+            """
+            Model of the temperature compensation, and the temperature range of the samples logged for its fit
+            """
+            from tempcomp import load_log
+            samples = load_log()
+            temps = [s[0] for s in samples]
+            result = {
+                'model': load_regression().get('tempComp'),
+                'samples': len(samples),
+                'minTemp': min(temps) if temps else None,
+                'maxTemp': max(temps) if temps else None
+            }
+            httpResponse.WriteResponseJSONOk(obj=result, headers=None)
+
+        @MicroWebSrv.route('/tempcomp', 'POST')
+        def tempcomp_post(httpClient, httpResponse):
+            """
+            Fit the temperature compensation from the logged samples, and save it with the calibration data
+            """
+            from tempcomp import fit, load_log
+            try:
+                model = fit(load_log())
+            except ValueError as e:
+                print(e)
+                httpResponse.WriteResponseBadRequest()
+                return
+            try:
+                regression = load_regression()
+                regression['tempComp'] = model
+                with open('regression.json', 'w') as f:
+                    ujson.dump(regression, f)
+                compile_snapshot()
+            except:
+                httpResponse.WriteResponseInternalServerError()
+            else:
+                if gy521:
+                    gy521.temp_comp = model
+                httpResponse.WriteResponseJSONOk(obj={'model': model}, headers=None)
+
+        @MicroWebSrv.route('/tempcomp/clear')
+        def tempcomp_clear_get(httpClient, httpResponse):
+            """
+            Delete the logged samples, the model is kept
+            """
+            from tempcomp import clear_log
+            clear_log()
+            httpResponse.WriteResponseOk()
+
         @MicroWebSrv.route('/settings')
         def settings_get(httpClient, httpResponse):
             """
@@ -85,6 +155,7 @@ class HttpServer:
             try:
                 with open('user_settings.json', 'w') as f:
                     ujson.dump(settings_dict, f)
+                compile_snapshot()
             except:
                 httpResponse.WriteResponseInternalServerError()
             else:
@@ -108,15 +179,8 @@ class HttpServer:
             """
             使ESP32进入深度睡眠，唤醒后便进入工作模式
             """
-            with open('hardware_config.json', 'r') as f:
-                json = f.read()
-            config = ujson.loads(json)
-
-            FIRSTSLEEP_TRIGGER = config['firstsleep_trigger']
-
             def first_sleep():
-                with open(FIRSTSLEEP_TRIGGER, 'w') as s:
-                    pass
+                boot_state.set(boot_state.FIRST_SLEEP)
                 machine.reset()
 
             tim = machine.Timer(-1)
@@ -155,15 +219,8 @@ class HttpServer:
             """
             Start FTP service
             """
-            with open('hardware_config.json', 'r') as f:
-                json = f.read()
-            config = ujson.loads(json)
-
-            FTP_TRIGGER = config['ftp_trigger']
-
             def start_ftp():
-                with open(FTP_TRIGGER, 'w') as s:
-                    pass
+                boot_state.set(boot_state.FTP)
                 machine.reset()
 
             tim = machine.Timer(-1)
@@ -193,6 +250,41 @@ class HttpServer:
                 print('The test message has been sent successfully.')
                 httpResponse.WriteResponseOk()
 
+        @MicroWebSrv.route('/capture')
+        def capture_get(httpClient, httpResponse):
+            """
+            Download the register reads recorded in working mode, see tools/replay_imu.py
+            """
+            from imucapture import ImuCapture
+            try:
+                uos.stat(ImuCapture.PATH)
+            except OSError:
+                httpResponse.WriteResponseNotFound()
+            else:
+                httpResponse.WriteResponseFileAttachment(ImuCapture.PATH, ImuCapture.PATH)
+
+        @MicroWebSrv.route('/capture/clear')
+        def capture_clear_get(httpClient, httpResponse):
+            """
+            Delete the recorded register reads
+            """
+            from imucapture import ImuCapture
+            ImuCapture.clear()
+            httpResponse.WriteResponseOk()
+
+        @MicroWebSrv.route('/imports')
+        def imports_get(httpClient, httpResponse):
+            """
+            Time and heap taken by the imports of this boot, and of the last working mode boot if profiled
+            """
+            from importprof import ImportProfiler
+            from rtcstore import RTCStore
+            profile = {
+                'calibration': import_profiler.summary() if import_profiler else [],
+                'working': ImportProfiler.load(RTCStore())
+            }
+            httpResponse.WriteResponseJSONOk(obj=profile, headers=None)
+
         # Initialize the Web server
         self.app = MicroWebSrv(webPath='/www')
         self.app.Start(threaded=True)  # Starts the server
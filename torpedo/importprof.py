@@ -0,0 +1,100 @@
+import builtins
+import gc
+import sys
+import utime
+
+
+class ImportProfiler:
+    """
+    Record the time and the heap taken by each module import.
+    builtins.__import__ is wrapped while the profiler is installed; the modules
+    already in sys.modules and the built-in modules are not recorded. The time
+    of a module includes the modules it imports, its own time excludes them.
+    Usage:
+        profiler = ImportProfiler()
+        profiler.install()
+        import gy521
+        profiler.report()
+    """
+    STORE_KEY = 'imports'
+
+    def __init__(self):
+        self.records = []  # [name, depth, total us, own us, heap bytes], in import order
+        self._import = None
+        self._children_us = []  # time taken by the nested imports, per import level
+
+    def install(self):
+        if self._import is None:
+            self._import = builtins.__import__
+            builtins.__import__ = self._profiled_import
+
+    def uninstall(self):
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+
+    def _profiled_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level == 0 and name in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+        record = [name, len(self._children_us), 0, 0, 0]
+        self.records.append(record)
+        self._children_us.append(0)
+        mem_free = gc.mem_free()
+        start = utime.ticks_us()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = utime.ticks_diff(utime.ticks_us(), start)
+            # the built-in modules are not added to sys.modules, they are not worth recording
+            if level == 0 and name not in sys.modules and self.records[-1] is record:
+                self.records.pop()
+            # may be negative if a garbage collection has run during the import
+            record[4] = mem_free - gc.mem_free()
+            record[2] = elapsed
+            record[3] = elapsed - self._children_us.pop()
+            if self._children_us:
+                self._children_us[-1] += elapsed
+
+    def summary(self):
+        """
+        :return: list; of dict e.g. {'name': 'imu', 'depth': 1, 'ms': 8.2, 'ownMs': 3.1, 'heap': 2112}
+        """
+        return [
+            {'name': r[0], 'depth': r[1], 'ms': r[2] / 1000, 'ownMs': r[3] / 1000, 'heap': r[4]}
+            for r in self.records
+        ]
+
+    def report(self):
+        """
+        Print the imports over serial, the nested imports are indented
+        """
+        print('Import profile (total ms, own ms, heap bytes):')
+        for name, depth, total, own, heap in self.records:
+            print('  ' + '  ' * depth + name + ': ' + str(total / 1000) + ', ' + str(own / 1000) + ', ' + str(heap))
+
+    def save(self, store):
+        """
+        Keep the imports of this boot in the RTC memory, to be read in calibration mode
+        :param store: RTCStore object
+        """
+        store.set(self.STORE_KEY, [[r[0], r[1], r[2] // 100, r[3] // 100, r[4]] for r in self.records])
+
+    @classmethod
+    def requested(cls):
+        """
+        Return True if the last working mode boot has kept its imports in the RTC memory, i.e. if profileImports
+        is on.  Checked on the raw RTC memory, so that the profiler can be installed before any other import
+        """
+        import machine
+        return b'"' + cls.STORE_KEY.encode() + b'"' in machine.RTC().memory()
+
+    @classmethod
+    def load(cls, store):
+        """
+        Return the imports saved by save(), in the format of summary()
+        :param store: RTCStore object
+        """
+        return [
+            {'name': r[0], 'depth': r[1], 'ms': r[2] / 10, 'ownMs': r[3] / 10, 'heap': r[4]}
+            for r in store.get(cls.STORE_KEY, [])
+        ]
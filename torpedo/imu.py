@@ -39,7 +39,8 @@ THE SOFTWARE.
 
 from utime import sleep_ms
 from machine import I2C, Pin
-from vector3d import Vector3d
+from ustruct import unpack_from
+from vector3d import ArrayVector3d
 
 
 class MPUException(OSError):
@@ -70,20 +71,36 @@ class MPU6050(object):
     _mpu_addr = (104, 105)  # addresses of MPU9150/MPU6050. There can be two devices
     _chip_id = 104
 
-    def __init__(self, sda, scl, device_addr=None, transposition=(0, 1, 2), scaling=(1, 1, 1)):
+    def __init__(self, sda, scl, device_addr=None, transposition=(0, 1, 2), scaling=(1, 1, 1), fast=False):
+        '''
+        fast=True is the bring-up after a deep sleep, when the device address is known
+        (device_addr must then be given) and the registers have just been reset by the power cycle:
+        no settle delay, a 400 kHz bus, and only the registers which differ from their defaults are written.
+        The caller then polls data_ready for the first sample.
+        '''
 
-        self._accel = Vector3d(transposition, scaling, self._accel_callback)
-        self._gyro = Vector3d(transposition, scaling, self._gyro_callback)
+        self._accel = ArrayVector3d(transposition, scaling, self._accel_callback)
+        self._gyro = ArrayVector3d(transposition, scaling, self._gyro_callback)
         self.buf1 = bytearray(1)                # Pre-allocated buffers for reads: allows reads to
         self.buf2 = bytearray(2)                # be done in interrupt handlers
         self.buf3 = bytearray(3)
         self.buf6 = bytearray(6)
-
-        sleep_ms(200)                           # Ensure PSU and device have settled
-        if isinstance(sda, int) and isinstance(scl, int):   # Already modified for use with esp32/8266
-            self._mpu_i2c = I2C(sda=Pin(sda), scl=Pin(scl))
-        #elif hasattr(side_str, 'readfrom'):     # Soft or hard I2C instance. See issue #3097
-        #    self._mpu_i2c = side_str
+        self.buf14 = bytearray(14)
+        self._accel_scale = 1 / 16384           # g per LSB, kept in step with accel_range
+        self._gyro_scale = 1 / 131              # degrees/s per LSB, kept in step with gyro_range
+        self.capture = None                     # ImuCapture object recording the reads, see imucapture.py
+
+        if fast and device_addr is None:
+            raise ValueError('The fast init needs the device address')
+        if not fast:
+            sleep_ms(200)                       # Ensure PSU and device have settled
+        if hasattr(sda, 'readfrom_mem_into'):  # I2C instance, e.g. a bus replaying a capture. scl is ignored
+            self._mpu_i2c = sda
+        elif isinstance(sda, int) and isinstance(scl, int):   # Already modified for use with esp32/8266
+            if fast:
+                self._mpu_i2c = I2C(sda=Pin(sda), scl=Pin(scl), freq=400000)  # fast mode I2C
+            else:
+                self._mpu_i2c = I2C(sda=Pin(sda), scl=Pin(scl))
         else:
             raise ValueError("Invalid I2C instance")
 
@@ -106,6 +123,10 @@ class MPU6050(object):
         # Line 105 is commented out to skip genuine chip check
         # Can communicate with chip. Set it up.
         self.wake()                             # wake it up
+        if fast:
+            # the ranges are already 0 after the power on reset, and the MPU6050 of the GY521
+            # has no magnetometer behind the auxiliary bus which would need the passthrough
+            return
         self.passthrough = True                 # Enable mag access from main I2C bus
         self.accel_range = 0                    # default to highest sensitivity
         self.gyro_range = 0                     # Likewise for gyro
@@ -116,6 +137,8 @@ class MPU6050(object):
         Read bytes to pre-allocated buffer Caller traps OSError.
         '''
         self._mpu_i2c.readfrom_mem_into(addr, memaddr, buf)
+        if self.capture is not None:
+            self.capture.record(memaddr, buf)
 
     # write to device
     def _write(self, data, memaddr, addr):
@@ -179,7 +202,7 @@ class MPU6050(object):
             self._read(self.buf2, 0x41, self.mpu_addr)
         except OSError:
             raise MPUException(self._I2Cerror)
-        return bytes_toint(self.buf2[0], self.buf2[1])/340 + 35  # I think
+        return unpack_from('>h', self.buf2)[0]/340 + 35  # I think
 
     # passthrough
     @property
@@ -208,6 +231,96 @@ class MPU6050(object):
         else:
             raise ValueError('pass either True or False')
 
+    # data ready interrupt
+    @property
+    def data_ready_int(self):
+        '''
+        Returns True if the data ready interrupt is enabled
+        '''
+        try:
+            self._read(self.buf1, 0x38, self.mpu_addr)
+            return self.buf1[0] & 0x01 > 0
+        except OSError:
+            raise MPUException(self._I2Cerror)
+
+    @data_ready_int.setter
+    def data_ready_int(self, enable):
+        '''
+        Enables or disables the data ready interrupt. It has to be enabled for
+        the data_ready property to report new samples.
+        '''
+        try:
+            self._write(0x01 if enable else 0x00, 0x38, self.mpu_addr)
+        except OSError:
+            raise MPUException(self._I2Cerror)
+
+    @property
+    def data_ready(self):
+        '''
+        Returns True if a new sample has been written to the sensor registers
+        since the last read of the interrupt status. Reading clears the flag.
+        '''
+        try:
+            self._read(self.buf1, 0x3A, self.mpu_addr)
+            return self.buf1[0] & 0x01 > 0
+        except OSError:
+            raise MPUException(self._I2Cerror)
+
+    # FIFO
+    def fifo_start(self):
+        '''
+        Resets the FIFO and starts queueing the accelerometer samples in it,
+        at the sample rate. The FIFO holds 1024 bytes i.e. 170 samples.
+        '''
+        try:
+            self._write(0x00, 0x23, self.mpu_addr)  # FIFO_EN: nothing queued during the reset
+            self._write(0x04, 0x6A, self.mpu_addr)  # USER_CTRL: FIFO_RESET
+            self._write(0x40, 0x6A, self.mpu_addr)  # USER_CTRL: FIFO_EN
+            self._write(0x08, 0x23, self.mpu_addr)  # FIFO_EN: ACCEL_FIFO_EN
+        except OSError:
+            raise MPUException(self._I2Cerror)
+
+    def fifo_stop(self):
+        '''
+        Stops queueing samples and disables the FIFO
+        '''
+        try:
+            self._write(0x00, 0x23, self.mpu_addr)
+            self._write(0x00, 0x6A, self.mpu_addr)
+        except OSError:
+            raise MPUException(self._I2Cerror)
+
+    @property
+    def fifo_count(self):
+        '''
+        Returns the number of bytes in the FIFO
+        '''
+        try:
+            self._read(self.buf2, 0x72, self.mpu_addr)
+        except OSError:
+            raise MPUException(self._I2Cerror)
+        return self.buf2[0] << 8 | self.buf2[1]
+
+    def read_fifo(self, buf):
+        '''
+        Drains the complete accelerometer samples of the FIFO in one I2C burst,
+        as many as fit in the pre-allocated buf (6 bytes per sample, big endian
+        x, y, z). If the FIFO has overflowed the samples are misaligned, so the
+        FIFO is reset and nothing is returned.
+        Returns the number of samples read.
+        '''
+        count = self.fifo_count
+        if count >= 1024:
+            self.fifo_start()
+            return 0
+        n = min(count, len(buf)) // 6
+        if n:
+            try:
+                self._read(memoryview(buf)[:n * 6], 0x74, self.mpu_addr)
+            except OSError:
+                raise MPUException(self._I2Cerror)
+        return n
+
     # sample rate. Not sure why you'd ever want to reduce this from the default.
     @property
     def sample_rate(self):
@@ -296,6 +409,7 @@ class MPU6050(object):
                 self._write(ar_bytes[accel_range], 0x1C, self.mpu_addr)
             except OSError:
                 raise MPUException(self._I2Cerror)
+            self._accel_scale = 1 / (16384 >> accel_range)
         else:
             raise ValueError('accel_range can only be 0, 1, 2 or 3')
 
@@ -328,6 +442,7 @@ class MPU6050(object):
                 self._write(gr_bytes[gyro_range], 0x1B, self.mpu_addr)  # Sets fchoice = b11 which enables filter
             except OSError:
                 raise MPUException(self._I2Cerror)
+            self._gyro_scale = 1 / (131, 65.5, 32.8, 16.4)[gyro_range]
         else:
             raise ValueError('gyro_range can only be 0, 1, 2 or 3')
 
@@ -347,13 +462,7 @@ class MPU6050(object):
             self._read(self.buf6, 0x3B, self.mpu_addr)
         except OSError:
             raise MPUException(self._I2Cerror)
-        self._accel._ivector[0] = bytes_toint(self.buf6[0], self.buf6[1])
-        self._accel._ivector[1] = bytes_toint(self.buf6[2], self.buf6[3])
-        self._accel._ivector[2] = bytes_toint(self.buf6[4], self.buf6[5])
-        scale = (16384, 8192, 4096, 2048)
-        self._accel._vector[0] = self._accel._ivector[0]/scale[self.accel_range]
-        self._accel._vector[1] = self._accel._ivector[1]/scale[self.accel_range]
-        self._accel._vector[2] = self._accel._ivector[2]/scale[self.accel_range]
+        self._decode(self._accel, self.buf6, 0, self._accel_scale)
 
     def get_accel_irq(self):
         '''
@@ -361,9 +470,36 @@ class MPU6050(object):
         unscaled integer accelerometer values
         '''
         self._read(self.buf6, 0x3B, self.mpu_addr)
-        self._accel._ivector[0] = bytes_toint(self.buf6[0], self.buf6[1])
-        self._accel._ivector[1] = bytes_toint(self.buf6[2], self.buf6[3])
-        self._accel._ivector[2] = bytes_toint(self.buf6[4], self.buf6[5])
+        ivector = self._accel._ivector
+        ivector[0], ivector[1], ivector[2] = unpack_from('>hhh', self.buf6)
+
+    @staticmethod
+    def _decode(vect, buf, offset, scale):
+        '''
+        Unpack three big endian int16 values of buf into the raw and scaled values of a Vector3d
+        '''
+        ivector = vect._ivector
+        vector = vect._vector
+        ivector[0], ivector[1], ivector[2] = unpack_from('>hhh', buf, offset)
+        vector[0] = ivector[0] * scale
+        vector[1] = ivector[1] * scale
+        vector[2] = ivector[2] * scale
+
+    def read_motion(self):
+        '''
+        Reads the accelerometer, the temperature and the gyro of the same sample
+        in one 14 bytes burst, updates the accel and gyro objects without reading
+        them again, and returns the temperature in degree C.
+        '''
+        try:
+            self._read(self.buf14, 0x3B, self.mpu_addr)
+        except OSError:
+            raise MPUException(self._I2Cerror)
+        self._decode(self._accel, self.buf14, 0, self._accel_scale)
+        self._decode(self._gyro, self.buf14, 8, self._gyro_scale)
+        self._accel.apply()
+        self._gyro.apply()
+        return unpack_from('>h', self.buf14, 6)[0]/340 + 35
 
     # Gyro
     @property
@@ -381,13 +517,7 @@ class MPU6050(object):
             self._read(self.buf6, 0x43, self.mpu_addr)
         except OSError:
             raise MPUException(self._I2Cerror)
-        self._gyro._ivector[0] = bytes_toint(self.buf6[0], self.buf6[1])
-        self._gyro._ivector[1] = bytes_toint(self.buf6[2], self.buf6[3])
-        self._gyro._ivector[2] = bytes_toint(self.buf6[4], self.buf6[5])
-        scale = (131, 65.5, 32.8, 16.4)
-        self._gyro._vector[0] = self._gyro._ivector[0]/scale[self.gyro_range]
-        self._gyro._vector[1] = self._gyro._ivector[1]/scale[self.gyro_range]
-        self._gyro._vector[2] = self._gyro._ivector[2]/scale[self.gyro_range]
+        self._decode(self._gyro, self.buf6, 0, self._gyro_scale)
 
     def get_gyro_irq(self):
         '''
@@ -395,6 +525,5 @@ class MPU6050(object):
         unscaled integer gyro values. Error trapping disallowed.
         '''
         self._read(self.buf6, 0x43, self.mpu_addr)
-        self._gyro._ivector[0] = bytes_toint(self.buf6[0], self.buf6[1])
-        self._gyro._ivector[1] = bytes_toint(self.buf6[2], self.buf6[3])
-        self._gyro._ivector[2] = bytes_toint(self.buf6[4], self.buf6[5])
+        ivector = self._gyro._ivector
+        ivector[0], ivector[1], ivector[2] = unpack_from('>hhh', self.buf6)
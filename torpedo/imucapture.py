@@ -0,0 +1,69 @@
+import ujson
+import uos
+import utime
+from ustruct import pack_into
+
+
+class ImuCapture:
+    """
+    Record the register reads of the MPU6050 to a file on the flash, so that a
+    measurement can be replayed off the device (see tools/replay_imu.py).
+    The file starts with MAGIC, followed by one frame per read: a header <IBH
+    (ticks_us, register, length) and the bytes read. Every capture session
+    starts with a frame of register SESSION, holding the sampling configuration
+    in JSON. The recording stops once the file has reached max_bytes.
+    Usage:
+        capture = ImuCapture()
+        capture.attach(gy521.imu, {'fifo': 32})
+        gy521.measure_tilt()
+        capture.close()
+    """
+    MAGIC = b'TIC1'
+    PATH = 'imu.cap'
+    SESSION = 0xFF  # not a register of the MPU6050
+
+    def __init__(self, path=PATH, max_bytes=65536):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.header = bytearray(7)
+        self.imu = None
+        try:
+            self.size = uos.stat(path)[6]
+        except OSError:
+            self.size = 0
+        self.file = open(path, 'ab')
+        if not self.size:
+            self.file.write(self.MAGIC)
+            self.size = len(self.MAGIC)
+
+    def attach(self, imu, info=None):
+        """
+        Start recording the reads of the MPU6050
+        :param imu: MPU6050 object
+        :param info: dict; sampling configuration, e.g. {'profile': 'precise', 'fifo': 32}
+        """
+        self.record(self.SESSION, ujson.dumps(info or {}).encode())
+        self.imu = imu
+        imu.capture = self
+
+    def record(self, memaddr, buf):
+        if self.size + 7 + len(buf) > self.max_bytes:
+            return
+        # the ticks wrap at 2**30 on the ESP32
+        pack_into('<IBH', self.header, 0, utime.ticks_us() & 0x3FFFFFFF, memaddr, len(buf))
+        self.file.write(self.header)
+        self.file.write(buf)
+        self.size += 7 + len(buf)
+
+    def close(self):
+        if self.imu is not None:
+            self.imu.capture = None
+            self.imu = None
+        self.file.close()
+
+    @classmethod
+    def clear(cls, path=PATH):
+        try:
+            uos.remove(path)
+        except OSError:
+            pass
@@ -1,26 +1,37 @@
-import esp
 import machine
+from importprof import ImportProfiler
+# Record the time and the heap taken by the imports, this must come before any other import.
+# A working mode wake only records them if profileImports was on at the last wake
+profiler = ImportProfiler()
+if machine.reset_cause() != machine.DEEPSLEEP_RESET or ImportProfiler.requested():
+    profiler.install()
+import esp
 import ujson
 import utime
+from configsnap import ConfigSnapshot, compile_snapshot, invalidate_snapshot
+from phasetimer import PhaseTimer
 
 
+# Time the phases of the boot for diagnostics
+timer = PhaseTimer()
 # disable os debug info
 esp.osdebug(None)
-# Loading hardware configurations from JSON file
+# Loading hardware configurations from the configuration snapshot
+timer.start('config')
 print('--------------------')
-with open('hardware_config.json', 'r') as f:
-    json = f.read()
-config = ujson.loads(json)
-print('File "hardware_config.json" has been loaded!')
-# Loading user settings from JSON file
-with open('user_settings.json', 'r') as f:
-    json = f.read()
-settings = ujson.loads(json)
-print('File "user_settings.json" has been loaded!')
+# The JSON files are only parsed at power on, when they are saved from the web page or when they have changed
+# (size or mtime), the other boots read the sections they need from the compiled snapshot
+if machine.reset_cause() not in (machine.SOFT_RESET, machine.DEEPSLEEP_RESET):
+    compile_snapshot()
+snapshot = ConfigSnapshot()
+config = snapshot.section('hardware')
+print('Hardware configurations have been loaded!')
 print('--------------------')
+timer.stop()
 
 GY521_SDA = config['gy521_pins']['sda']
 GY521_SCL = config['gy521_pins']['scl']
+GY521_INT = config['gy521_pins'].get('int')
 BAT_ADC_PIN = config['battery_adc_pin']
 VPP_PIN = config['vpp_pin']
 MODE_PIN = config['mode_pin']
@@ -29,9 +40,6 @@ OB_LED_PIN = config['onboard_led']['pin']
 OB_LED_INVERT = config['onboard_led']['active_low']
 GRN_LED_PIN = config['green_led_pin']
 RED_LED_PIN = config['red_led_pin']
-DEEPSLEEP_TRIGGER = config['deepsleep_trigger']
-FIRSTSLEEP_TRIGGER = config['firstsleep_trigger']
-FTP_TRIGGER = config['ftp_trigger']
 # FIRSTSLEEP_MS = const(60000)  # 1 minutes
 FIRSTSLEEP_MS = const(1200000)  # 20 minutes
 
@@ -41,17 +49,23 @@ print('The VPP pin has been initialized')
 print('--------------------')
 
 
-def initialization(init_gy521=True, init_ds18=True, init_bat=True, init_wifi=True):
+def initialization(init_gy521=True, init_ds18=True, init_bat=True, init_wifi=True, rtc_store=None, mode='working'):
     """
     Initialize GY521 module, battery ADC pin and wifi
     NOTE: VPP pin must be turned on in order to initialize the GY521 module
+    :param rtc_store: RTCStore object used to cache the state of the peripherals across deep sleeps
+    :param mode: str; 'working' or 'calibration', selects the acquisition profile of the GY521 module
+        and the resolution of the DS18B20 sensor
     """
     if init_gy521:
         from gy521 import GY521
         # Initialize the GY521 module
         print('Initializing GY521 module')
         try:
-            gy521_sensor = GY521(GY521_SDA, GY521_SCL)
+            profile = settings.get('imuProfile', {}).get(mode)
+            temp_comp = snapshot.section('regression').get('tempComp')
+            gy521_sensor = GY521(GY521_SDA, GY521_SCL, settings.get('tiltFifoSamples', 0), rtc_store, profile,
+                                 GY521_INT, temp_comp)
         except Exception as e:
             print(e)
             gy521_sensor = None
@@ -59,12 +73,14 @@ def initialization(init_gy521=True, init_ds18=True, init_bat=True, init_wifi=Tru
         gy521_sensor = None
 
     if init_ds18:
-        from tempsensor import Ds18Sensors, SingleTempSensor
+        from tempsensor import Ds18Sensors, MultiTempSensor
         print('Initializing DS18B20 sensor')
         try:
-            ow = Ds18Sensors(OW_PIN)
-            romcode_string = ow.get_device_list()[0].get('value')
-            ds18_sensor = SingleTempSensor(ow, romcode_string)
+            ow = Ds18Sensors(OW_PIN, rtc_store)
+            # the ROM codes are cached in the RTC memory, the bus is only searched again if a sensor fails
+            ds18_sensor = MultiTempSensor(ow, ow.get_romcodes(), settings.get('ds18Labels', {}))
+            # a lower resolution converts faster
+            ds18_sensor.set_resolution(settings.get('ds18Resolution', {}).get(mode, 12))
         except Exception as e:
             print(e)
             ds18_sensor = None
@@ -83,7 +99,7 @@ def initialization(init_gy521=True, init_ds18=True, init_bat=True, init_wifi=Tru
         from wifi import WiFi
         # Initialize Wifi
         print('Initializing WiFi')
-        wlan = WiFi()
+        wlan = WiFi(rtc_store)
     else:
         wlan = None
     return gy521_sensor, ds18_sensor, lipo, wlan
@@ -103,6 +119,41 @@ def open_wireless(wlan):
     print('--------------------')
 
 
+def mqtt_payload(reading):
+    """
+    Format a reading for the MQTT broker
+    :param reading: dict; with the keys temperature, sg, plato, battery and optionally ageSec, temperatures
+    :return: dict
+    """
+    # Format for ChinaMobile OneNET IoT platform
+    if settings.get('mqtt').get('brokerAddr') == '183.230.40.96' and\
+            settings.get('mqtt').get('brokerPort') == 1883:
+        payload = {
+            # 'id': machine_id,
+            'id': 123,
+            'dp': {
+                'temperature': [{'v': reading['temperature']}],
+                'sg': [{'v': reading['sg']}],
+                'plato': [{'v': reading['plato']}],
+                'battery': [{'v': reading['battery']}]
+            }
+        }
+        for label, value in reading.get('temperatures', {}).items():
+            payload['dp']['temperature_' + label] = [{'v': value}]
+        return payload
+    payload = {
+        'temperature': reading['temperature'],
+        'sg': reading['sg'],
+        'plato': reading['plato'],
+        'battery': reading['battery']
+    }
+    if 'temperatures' in reading:
+        payload['temperatures'] = reading['temperatures']
+    if 'ageSec' in reading:
+        payload['ageSec'] = reading['ageSec']
+    return payload
+
+
 def pull_hold_pins():
     """
     Set output pins to input with pull hold to save power consumption
@@ -139,23 +190,34 @@ def init_leds():
 
 
 if machine.reset_cause() == machine.SOFT_RESET:
-    import uos
+    from rtcstore import RTCStore
+    from bootstate import BootState
+    rtc_store = RTCStore()
+    boot_state = BootState(rtc_store, config)
+    mode = boot_state.get()
 
     # 初次进入休眠状态
-    if FIRSTSLEEP_TRIGGER in uos.listdir():
-        uos.remove(FIRSTSLEEP_TRIGGER)
-        with open(DEEPSLEEP_TRIGGER, 'w') as f:
-            pass
+    if mode == BootState.FIRST_SLEEP:
+        boot_state.set(BootState.WORKING)
         pull_hold_pins()
         machine.deepsleep(FIRSTSLEEP_MS)
     # 工作模式下的休眠状态
-    elif DEEPSLEEP_TRIGGER in uos.listdir():
+    elif mode == BootState.WORKING:
         pull_hold_pins()
-        machine.deepsleep(settings['deepSleepIntervalMs'])
+        # the interval may have been adapted to the fermentation activity in working mode
+        sleep_ms = rtc_store.get('sleep_ms')
+        if sleep_ms is None:
+            sleep_ms = snapshot.section('settings')['deepSleepIntervalMs']
+        machine.deepsleep(sleep_ms)
     # FTP开启
-    elif FTP_TRIGGER in uos.listdir():
-        uos.remove(FTP_TRIGGER)
-        _, _, _, wifi = initialization(init_gy521=False, init_ds18=False, init_bat=False, init_wifi=True)
+    elif mode == BootState.FTP:
+        boot_state.set(BootState.CALIBRATION)
+        settings = snapshot.section('settings')
+        # the JSON files may be replaced over FTP, the next boot compiles them again
+        invalidate_snapshot()
+        # the AP cached in working mode is reconnected without a scan
+        _, _, _, wifi = initialization(init_gy521=False, init_ds18=False, init_bat=False, init_wifi=True,
+                                       rtc_store=rtc_store)
         onboard_led, _, _ = init_leds()
         onboard_led.on()
         open_wireless(wifi)
@@ -165,10 +227,16 @@ if machine.reset_cause() == machine.SOFT_RESET:
     # 进入校准模式
     else:
         import gc
+        # compile the JSON files again, in case they have been edited with the device running
+        compile_snapshot()
+        snapshot = ConfigSnapshot()
+        settings = snapshot.section('settings')
         # Turn on VPP to supply power for GY521
         vpp.on()
         # Initialize the peripherals
-        gy521, ds18, battery, wifi = initialization(init_gy521=True, init_ds18=True, init_bat=True, init_wifi=True)
+        # the AP cached in working mode is reconnected without a scan
+        gy521, ds18, battery, wifi = initialization(init_gy521=True, init_ds18=True, init_bat=True, init_wifi=True,
+                                                    rtc_store=rtc_store, mode='calibration')
         print('Entering Calibration Mode...')
         print('--------------------')
         # 1. Turn on the on-board green led to indicate calibration mode
@@ -192,27 +260,37 @@ if machine.reset_cause() == machine.SOFT_RESET:
         tilt_th = _thread.start_new_thread(measure_tilt, ())
         # 4. Set up HTTP Server
         from httpserver import HttpServer
-        web = HttpServer(gy521, wifi, settings)
+        web = HttpServer(gy521, wifi, settings, boot_state, profiler)
         print('HTTP server initialized')
         web.start()
+        profiler.uninstall()
+        profiler.report()
         utime.sleep_ms(3000)
         if web.is_started():
             print('HTTP service started')
         print('--------------------')
 # 工作模式
 elif machine.reset_cause() == machine.DEEPSLEEP_RESET:
+    from rtcstore import RTCStore
+    from bootstate import BootState
+    timer.start('init')
+    rtc_store = RTCStore()
+    boot_state = BootState(rtc_store, config)
+    settings = snapshot.section('settings')
+    profile_imports = settings.get('profileImports', False)
+    if not profile_imports:
+        profiler.uninstall()
+        rtc_store.remove(ImportProfiler.STORE_KEY)
+    report_timing = settings.get('reportTiming', False)
     from microWebCli import MicroWebCli
     # Unhold the pins to allow those pins to be used
     unhold_pins()
     # Turn on VPP to supply power for GY521 and allow battery voltage measurement
     vpp.on()
-    # Initialize the peripherals
-    gy521, ds18, battery, wifi = initialization(init_gy521=True, init_ds18=True, init_bat=True, init_wifi=True)
-    print('Entering Working Mode...')
-    utime.sleep_ms(500)
     send_data_to_fermenter = settings['fermenterAp']['enabled']
     send_data_to_mqtt = settings['mqtt']['enabled']
-    # 1. Start WLAN in STA mode and connect to AP
+    # 1. Start WLAN in STA mode and start connecting to the AP.
+    # The association and DHCP run in the background while the sensors are read.
     if send_data_to_mqtt:
         ssid = settings['wifi'].get('ssid')
         pswd = settings['wifi'].get('pass')
@@ -220,39 +298,83 @@ elif machine.reset_cause() == machine.DEEPSLEEP_RESET:
         ssid = settings['fermenterAp'].get('ssid')
         pswd = settings['fermenterAp'].get('pass')
 
-    if ssid:
-        sta_ip_addr = wifi.sta_connect(ssid, pswd)
-        if sta_ip_addr:
-            print('STA IP: ' + sta_ip_addr)
-    else:
+    if not ssid:
         print('Pls set up the Wifi connection first.')
         print('Entering Calibration Mode in 5sec...')
-        if DEEPSLEEP_TRIGGER in uos.listdir():
-            uos.remove(DEEPSLEEP_TRIGGER)
+        boot_state.set(BootState.CALIBRATION)
         utime.sleep_ms(5000)
         machine.reset()
+    # Readings can be queued in the RTC memory, so that the radio is only used every Nth wake
+    batch_settings = settings.get('batch', {})
+    if batch_settings.get('enabled'):
+        from batch import ReadingBatch
+        batch = ReadingBatch(rtc_store, batch_settings.get('size', 6), batch_settings.get('sgDelta', 0.002))
+    else:
+        batch = None
+    # The DS18B20 conversion takes the longest, it runs while the rest of the wake cycle is done
+    _, ds18, _, _ = initialization(init_gy521=False, init_ds18=True, init_bat=False, init_wifi=False,
+                                   rtc_store=rtc_store)
+    if ds18:
+        ds18.start()
+    wifi = None
+    if not batch or batch.is_due():
+        _, _, _, wifi = initialization(init_gy521=False, init_ds18=False, init_bat=False, init_wifi=True,
+                                       rtc_store=rtc_store)
+        wifi.sta_connect_start(ssid, pswd)
+    # Initialize the sensors
+    gy521, _, battery, _ = initialization(init_gy521=True, init_ds18=False, init_bat=True, init_wifi=False,
+                                          rtc_store=rtc_store)
+    print('Entering Working Mode...')
     print('--------------------')
     # 2. Measure Lipo battery level
+    # NOTE: the battery ADC pin is on ADC1, which keeps working while the radio is on
+    timer.start('battery')
     battery_voltage = battery.get_lipo_voltage()
-    utime.sleep_ms(200)
     battery_percent = battery.get_lipo_level()
     # 3. Measure tilt angle
-    _, tilt, _ = gy521.get_smoothed_angles()
-    utime.sleep_ms(200)
+    timer.start('tilt')
+    # only beta is used in working mode, the sampling stops once the estimate has converged
+    still_settings = settings.get('stillnessGate', {})
+    capture_settings = settings.get('imuCapture', {})
+    capture = None
+    if capture_settings.get('enabled'):
+        # record the register reads of the measurement, to replay it off the device
+        from imucapture import ImuCapture
+        capture = ImuCapture(max_bytes=capture_settings.get('maxBytes', 65536))
+        capture.attach(gy521.imu, {'profile': gy521.profile, 'fifo': gy521.fifo_samples,
+                                   'irq': gy521.ring is not None, 'still': bool(still_settings.get('enabled'))})
+    if still_settings.get('enabled'):
+        # wait for the hydrometer to stop bobbing, e.g. after a CO2 bubble has left
+        tilt, tilt_std, still = gy521.measure_still_tilt(gyro_dps=still_settings.get('gyroDps', 2.0),
+                                                         accel_std=still_settings.get('accelStd', 0.3),
+                                                         timeout_ms=still_settings.get('timeoutMs', 2000))
+        if not still:
+            print('Not still before the deadline, the quietest samples are used')
+    else:
+        tilt, tilt_std = gy521.measure_tilt()
+    if capture:
+        capture.close()
+    print('Tilt: ' + str(tilt) + ' +/- ' + str(tilt_std))
+    if settings.get('tempCompLog', False):
+        # data for the fit of the temperature compensation, the hydrometer floats in plain water
+        from tempcomp import log_sample
+        log_sample(gy521)
     # 4. Measure temperature
+    timer.start('temperature')
+    # collect() waits for what is left of the conversion started at the beginning of the cycle,
+    # all the probes have converted at once
     try:
-        ds18.read_temp()
-        utime.sleep_ms(100)
-        temp = ds18.read_temp()
+        temps = ds18.collect()
+        temp = temps[ds18.primary]
     except Exception as e:
         print(e)
+        temps = {}
         temp = None
     # 5. Turn off VPP to save power
     vpp.off()
     # 6. Calculate Specific Gravity
-    with open('regression.json', 'r') as f:
-        json = f.read()
-    reg = ujson.loads(json)
+    timer.start('regression')
+    reg = snapshot.section('regression')
     param_a = reg.get('a')
     param_b = reg.get('b')
     param_c = reg.get('c')
@@ -260,6 +382,7 @@ elif machine.reset_cause() == machine.DEEPSLEEP_RESET:
     if not (param_a and param_b and param_c):
         print('The Hydrometer should be calibrated before use.')
         print('Entering Calibration Mode in 5sec...')
+        boot_state.set(BootState.CALIBRATION)
         utime.sleep_ms(5000)
         machine.reset()
     gravity = param_a * tilt**2 + param_b * tilt + param_c
@@ -270,106 +393,153 @@ elif machine.reset_cause() == machine.DEEPSLEEP_RESET:
         sg = round(gravity, 3)
         plato = round((-1 * 616.868) + (1111.14 * gravity) - (630.272 * gravity ** 2) + (135.997 * gravity ** 3), 1)
 
-    if wifi.is_connected():
-        machine_id = int.from_bytes(machine.unique_id(), 'big')
-        # 5.1. Send Specific Gravity data & battery level by MQTT
-        if send_data_to_mqtt:
-            from mqtt_client import MQTT
-            # Format for ChinaMobile OneNET IoT platform
-            if settings.get('mqtt').get('brokerAddr') == '183.230.40.96' and\
-                    settings.get('mqtt').get('brokerPort') == 1883:
-                hydrometer_dict = {
-                    # 'id': machine_id,
-                    'id': 123,
-                    'dp': {
-                        'temperature': [{'v': temp}],
-                        'sg': [{'v': sg}],
-                        'plato': [{'v': plato}],
-                        'battery': [{'v': battery_voltage}]
-                    }
-                }
+    # 7. Work out when to wake up next, from the fermentation activity if enabled
+    sleep_interval_ms = settings['deepSleepIntervalMs']
+    adaptive_settings = settings.get('adaptiveInterval', {})
+    if adaptive_settings.get('enabled'):
+        from scheduler import SleepScheduler
+        scheduler = SleepScheduler(rtc_store, sleep_interval_ms,
+                                   adaptive_settings.get('minMs', sleep_interval_ms),
+                                   adaptive_settings.get('maxMs', sleep_interval_ms))
+        sleep_interval_ms = scheduler.add(sg)
+        print('Next wake up in ' + str(sleep_interval_ms // 1000) + 's')
+    rtc_store.set('sleep_ms', sleep_interval_ms)
+    # 8. Queue the reading, and send the batch if it is full or if the gravity has changed
+    if batch:
+        batch.append(tilt, sg, plato, temp, battery_voltage, temps if len(temps) > 1 else None)
+        if not wifi and batch.should_flush():
+            _, _, _, wifi = initialization(init_gy521=False, init_ds18=False, init_bat=False, init_wifi=True,
+                                           rtc_store=rtc_store)
+            wifi.sta_connect_start(ssid, pswd)
+        if wifi:
+            print('Sending a batch of ' + str(batch.count()) + ' readings')
+        else:
+            print('Reading queued (' + str(batch.count()) + '/' + str(batch.size) + ')')
+
+    if wifi:
+        # 9. Wait for the WiFi connection started in step 1 (or 8)
+        timer.start('wifi')
+        sta_ip_addr = wifi.sta_connect_wait()
+        if sta_ip_addr:
+            print('STA IP: ' + sta_ip_addr)
+        print('WiFi connection stats: ' + str(wifi.get_stats()))
+        timer.start('publish')
+        sent = False
+        if wifi.is_connected():
+            machine_id = int.from_bytes(machine.unique_id(), 'big')
+            # 5.1. Send Specific Gravity data & battery level by MQTT
+            if send_data_to_mqtt:
+                from mqtt_client import MQTT
+                if batch:
+                    readings = batch.get_readings()
+                else:
+                    readings = [{'temperature': temp, 'sg': sg, 'plato': plato, 'battery': battery_voltage}]
+                    if len(temps) > 1:
+                        readings[0]['temperatures'] = temps
+                mqtt_msgs = []
+                for reading in readings:
+                    hydrometer_dict = mqtt_payload(reading)
+                    if reading is readings[-1] and report_timing and 'dp' not in hydrometer_dict:
+                        hydrometer_dict['timing'] = timer.summary()
+                    mqtt_msgs.append(ujson.dumps(hydrometer_dict))
+                # All the readings are published in one session
+                client = MQTT(settings)
+                sent = client.publish_many(mqtt_msgs)
+            # 5.2. Send Specific Gravity data & battery level to Fermenter ESP32 by HTTP
             else:
                 hydrometer_dict = {
+                    'name': settings.get('apSsid'),
+                    'ID': machine_id,
                     'temperature': temp,
-                    'sg': sg,
-                    'plato': plato,
-                    'battery': battery_voltage
+                    'angle': tilt,
+                    'angleStd': tilt_std,
+                    'battery': battery_voltage,
+                    'fahrenheit': round(temp * 1.8 + 32, 1),
+                    'currentGravity': sg,
+                    'currentPlato': plato,
+                    'batteryLevel': battery_percent,
+                    'updateIntervalMs': int(sleep_interval_ms)
                 }
-            mqtt_data = ujson.dumps(hydrometer_dict)
-            client = MQTT(settings)
-            client.publish(mqtt_data)
-        # 5.2. Send Specific Gravity data & battery level to Fermenter ESP32 by HTTP
-        else:
-            hydrometer_dict = {
-                'name': settings.get('apSsid'),
-                'ID': machine_id,
-                'temperature': temp,
-                'angle': tilt,
-                'battery': battery_voltage,
-                'fahrenheit': round(temp * 1.8 + 32, 1),
-                'currentGravity': sg,
-                'currentPlato': plato,
-                'batteryLevel': battery_percent,
-                'updateIntervalMs': int(settings['deepSleepIntervalMs'])
-            }
-
-            host = settings['fermenterAp']['host']
-            api = settings['fermenterAp']['api']
-            if not host.startswith('http://'):
-                host = 'http://' + host.strip()
-            if host.endswith('/'):
-                host = host[:-1]
-            if not api.startswith('/'):
-                api = '/' + api.strip()
-            url = host + api
-            # api_url='/api/hydrometer/v1/data',  # CraftBeerPi3 API
-
-            cli = MicroWebCli(
-                # Fermenter ESP32 API
-                url=url,
-                # Postman mock server for testing
-                # url='https://ba36095e-b0f1-430a-80a8-e32eb8663be8.mock.pstmn.io/gravity',
-                method='POST',
-                connTimeoutSec=60
-            )
-            req_counter = 0
-            while req_counter < 3:
-                print('Sending hydrometer data to the fermenter...')
-                print('URL: ' + url)
-                print(hydrometer_dict)
-                try:
-                    cli.OpenRequestJSONData(o=hydrometer_dict)
-                except Exception:
-                    print('Error: Cannot reach the server.')
-                    print('Will retry in 3sec...')
-                    utime.sleep_ms(3000)
-                    req_counter += 1
-                else:
-                    resp = cli.GetResponse()
-                    if not resp.IsSuccess():
-                        print('Error ' + str(resp.GetStatusCode()) + ': ' + resp.GetStatusMessage())
+                # The temperature of every probe, by label, when there are several
+                if len(temps) > 1:
+                    hydrometer_dict['temperatures'] = temps
+                if report_timing:
+                    hydrometer_dict['timing'] = timer.summary()
+                # The earlier readings of the batch are sent along with the current one
+                if batch and batch.count() > 1:
+                    hydrometer_dict['batch'] = batch.get_readings()[:-1]
+
+                host = settings['fermenterAp']['host']
+                api = settings['fermenterAp']['api']
+                if not host.startswith('http://'):
+                    host = 'http://' + host.strip()
+                if host.endswith('/'):
+                    host = host[:-1]
+                if not api.startswith('/'):
+                    api = '/' + api.strip()
+                url = host + api
+                # api_url='/api/hydrometer/v1/data',  # CraftBeerPi3 API
+
+                cli = MicroWebCli(
+                    # Fermenter ESP32 API
+                    url=url,
+                    # Postman mock server for testing
+                    # url='https://ba36095e-b0f1-430a-80a8-e32eb8663be8.mock.pstmn.io/gravity',
+                    method='POST',
+                    connTimeoutSec=60
+                )
+                req_counter = 0
+                while req_counter < 3:
+                    print('Sending hydrometer data to the fermenter...')
+                    print('URL: ' + url)
+                    print(hydrometer_dict)
+                    try:
+                        cli.OpenRequestJSONData(o=hydrometer_dict)
+                    except Exception:
+                        print('Error: Cannot reach the server.')
                         print('Will retry in 3sec...')
                         utime.sleep_ms(3000)
                         req_counter += 1
-                        print('Retry #' + str(req_counter))
                     else:
-                        print('Data sent successfully!')
-                        break
-        wifi.sta_disconnect()
-        utime.sleep_ms(200)
+                        resp = cli.GetResponse()
+                        if not resp.IsSuccess():
+                            print('Error ' + str(resp.GetStatusCode()) + ': ' + resp.GetStatusMessage())
+                            print('Will retry in 3sec...')
+                            utime.sleep_ms(3000)
+                            req_counter += 1
+                            print('Retry #' + str(req_counter))
+                        else:
+                            print('Data sent successfully!')
+                            sent = True
+                            break
+            wifi.sta_disconnect()
+            utime.sleep_ms(200)
+        # Keep the batch in the RTC memory until it has been delivered
+        if batch and sent:
+            batch.clear()
+    timer.stop()
+    # Keep the timing of the last cycles in the RTC memory
+    timer.report()
+    timer.save(rtc_store)
+    if profile_imports:
+        profiler.report()
+        profiler.save(rtc_store)
+    # The first wake after the first sleep switches the mode, later wakes leave the flash alone
+    boot_state.set(BootState.WORKING)
+    rtc_store.save()
     # 6. Go deep sleep again, and will wake up after sometime to repeat above.
-    with open(DEEPSLEEP_TRIGGER, 'w') as f:
-        pass
+    # The sleep is entered right away, the state is kept in the RTC memory rather than in a trigger file
     print('Sleeping now...')
-    machine.reset()
+    if wifi:
+        wifi.sta.active(False)
+    pull_hold_pins()
+    machine.deepsleep(sleep_interval_ms)
 # 首次开机，用户有1分钟时间出发模式选择开关进去校准模式; 1分钟之后程序会进入DEEP-SLEEP模式，再次唤醒后将开始工作
 else:
-    import uos
-
-    if DEEPSLEEP_TRIGGER in uos.listdir():
-        uos.remove(DEEPSLEEP_TRIGGER)
-    if FIRSTSLEEP_TRIGGER in uos.listdir():
-        uos.remove(FIRSTSLEEP_TRIGGER)
+    from rtcstore import RTCStore
+    from bootstate import BootState
+    boot_state = BootState(RTCStore(), config)
+    boot_state.reset()
 
     # Initialize LEDs and battery power management
     onboard_led, red_led, green_led = init_leds()
@@ -395,8 +565,7 @@ else:
     print('The system will go into Working Mode when 1 minute is out.')
 
     def first_sleep():
-        with open(FIRSTSLEEP_TRIGGER, 'w') as s:
-            pass
+        boot_state.set(BootState.FIRST_SLEEP)
         utime.sleep_ms(500)
         machine.reset()
 
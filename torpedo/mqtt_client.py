@@ -1,7 +1,6 @@
-import utime
-
 # from umqtt.robust import MQTTClient
-from lib.umqtt.simple2 import MQTTClient
+from lib.umqtt.simple2 import MQTTClient, MQTTException
+from ready import wait_until
 
 
 class MQTT:
@@ -15,6 +14,8 @@ class MQTT:
         client_id = settings.get('clientId')
         self.enabled = settings.get('enabled')
         self.interval_ms = settings.get('pubIntervalMs')
+        self.qos = settings.get('qos', 1)
+        self.ack_timeout_ms = settings.get('ackTimeoutMs', 3000)
         the_topic = settings.get('topic')
         if the_topic.endswith('/'):
             the_topic = the_topic[:-1]
@@ -27,6 +28,9 @@ class MQTT:
             password=password,
             keepalive=10
         )
+        # pids of the QoS 1 messages acknowledged by the broker; a pid also leaves rcv_pids when it times out
+        self.acked_pids = set()
+        self.client.set_callback_status(self._on_status)
 
     def is_enabled(self):
         return self.enabled
@@ -41,24 +45,75 @@ class MQTT:
         return self.interval_ms
 
     def connect(self):
+        """
+        :return: bool; True once the CONNACK has been received
+        """
         try:
             self.client.connect()
-        except:
+        except Exception:
             print('Failed to connect to the MQTT broker.')
+            return False
+        return True
 
     def disconnect(self):
         self.client.disconnect()
 
-    def publish(self, str_msg):
-        try:
-            self.connect()
-            utime.sleep_ms(1000)
-        except:
+    def _on_status(self, pid, status):
+        # status: 0 timeout, 1 acknowledged, 2 unknown pid
+        if status == 1:
+            self.acked_pids.add(pid)
+
+    def is_acked(self, pids):
+        """
+        Process the incoming packets and check if the broker has acknowledged the messages
+        :param pids: list; packet ids of the QoS 1 messages
+        """
+        self.client.check_msg()
+        for pid in pids:
+            if pid not in self.acked_pids:
+                return False
+        return True
+
+    def is_writable(self):
+        return bool(self.client.poller_w.poll(0))
+
+    def publish_many(self, str_msgs):
+        """
+        Publish several messages in a single session
+        :param str_msgs: list; of str or bytes
+        :return: bool; True if the messages have been acknowledged by the broker
+        """
+        if not self.connect():
             print('Failed to publish the data to the MQTT broker.')
-        else:
-            msg = str.encode(str_msg) if isinstance(str_msg, str) else str_msg
-            print(msg)
-            self.client.publish(self.topic, msg)
-            utime.sleep_ms(1000)
+            return False
+        pids = []
+        self.acked_pids.clear()
+        ready = True
+        try:
+            for str_msg in str_msgs:
+                msg = str.encode(str_msg) if isinstance(str_msg, str) else str_msg
+                print(msg)
+                pid = self.client.publish(self.topic, msg, qos=self.qos)
+                if pid:
+                    pids.append(pid)
+                # With QoS 0, wait until the socket has room again before the next message
+                elif not wait_until(self.is_writable, self.ack_timeout_ms, poll_ms=20):
+                    ready = False
+            # With QoS 1, wait until the broker acknowledges all the messages before disconnecting
+            if pids and not wait_until(lambda: self.is_acked(pids), self.ack_timeout_ms, poll_ms=20):
+                ready = False
+            if not ready:
+                print('No acknowledgement from the MQTT broker.')
+        except (OSError, MQTTException) as e:
+            print('Failed to publish the data to the MQTT broker: ' + str(e))
+            ready = False
+        try:
             self.disconnect()
+        except (OSError, MQTTException):
+            pass
+        if ready:
             print('Data have been sent to MQTT broker.')
+        return ready
+
+    def publish(self, str_msg):
+        return self.publish_many([str_msg])
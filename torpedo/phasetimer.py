@@ -0,0 +1,105 @@
+import utime
+
+
+class PhaseTimer:
+    """
+    Record how long each phase of a wake cycle takes, in micro-seconds.
+    Usage:
+        timer = PhaseTimer()
+        timer.start('wifi')
+        ...
+        timer.stop()
+    or:
+        with timer.phase('wifi'):
+            ...
+    """
+    STORE_KEY = 'timing'
+
+    def __init__(self, history=3):
+        """
+        :param history: int; number of past cycles kept in the RTC memory
+        """
+        self.history = history
+        self.cycle_start = utime.ticks_us()
+        self.spans = []  # list of (phase name, duration in us)
+        self._name = None
+        self._start = 0
+
+    def start(self, name):
+        """
+        Start timing a phase, the running phase (if any) is stopped first
+        :param name: str; name of the phase
+        """
+        if self._name:
+            self.stop()
+        self._name = name
+        self._start = utime.ticks_us()
+
+    def stop(self):
+        """
+        Stop timing the running phase
+        :return: int; duration of the phase in us
+        """
+        if not self._name:
+            return 0
+        span = utime.ticks_diff(utime.ticks_us(), self._start)
+        self.spans.append((self._name, span))
+        self._name = None
+        return span
+
+    def phase(self, name):
+        self.start(name)
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def elapsed_us(self):
+        """
+        Return the time elapsed since the beginning of the cycle
+        """
+        return utime.ticks_diff(utime.ticks_us(), self.cycle_start)
+
+    def summary(self):
+        """
+        Compact summary of the cycle, phase durations are in ms
+        Repeated phases are summed up.
+        :return: dict; e.g. {'init': 812, 'wifi': 2350, 'total': 4120}
+        """
+        result = {}
+        for name, span in self.spans:
+            result[name] = result.get(name, 0) + span
+        for name in result:
+            result[name] = result[name] // 1000
+        result['total'] = self.elapsed_us() // 1000
+        return result
+
+    def report(self):
+        """
+        Print the timing of the current cycle over serial
+        """
+        print('Phase timing (ms):')
+        for name, span in self.spans:
+            print('  ' + name + ': ' + str(span / 1000))
+        print('  total: ' + str(self.elapsed_us() / 1000))
+
+    def save(self, store):
+        """
+        Append the summary of this cycle to the history kept in the RTC memory
+        :param store: RTCStore object
+        """
+        cycles = store.get(self.STORE_KEY, [])
+        cycles.append(self.summary())
+        store.set(self.STORE_KEY, cycles[-self.history:])
+
+    @classmethod
+    def load_history(cls, store):
+        """
+        Return the summaries of the last cycles, oldest first
+        :param store: RTCStore object
+        :return: list
+        """
+        return store.get(cls.STORE_KEY, [])
@@ -0,0 +1,18 @@
+import utime
+
+
+def wait_until(condition, timeout, poll_ms=5):
+    """
+    Poll a readiness condition until it is met or the deadline has passed,
+    so that a step only takes as long as the hardware needs
+    :param condition: callable; returns True when ready
+    :param timeout: int; deadline in ms
+    :param poll_ms: int; interval between two polls in ms
+    :return: bool; True if the condition has been met before the deadline
+    """
+    start = utime.ticks_ms()
+    while not condition():
+        if utime.ticks_diff(utime.ticks_ms(), start) >= timeout:
+            return False
+        utime.sleep_ms(poll_ms)
+    return True
@@ -0,0 +1,69 @@
+import machine
+import ujson
+
+
+class RTCStore:
+    """
+    Small key/value store kept in the RTC slow memory.
+    The RTC memory survives deep sleep and soft resets, but not a power cycle,
+    so anything stored here must be safe to lose.
+    """
+    MAGIC = b'TPD1'
+    MAX_BYTES = 2048  # size of the ESP32 RTC user memory
+    # diagnostics, dropped in this order when the data does not fit in MAX_BYTES
+    EXPENDABLE = ('imports', 'timing', 'wifi_stats')
+
+    def __init__(self):
+        self.rtc = machine.RTC()
+        self.data = self._load()
+        self.dirty = False
+
+    def _load(self):
+        raw = self.rtc.memory()
+        if not raw.startswith(self.MAGIC):
+            return {}
+        try:
+            data = ujson.loads(raw[len(self.MAGIC):])
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.data[key] = value
+        self.dirty = True
+
+    def remove(self, key):
+        if key in self.data:
+            del self.data[key]
+            self.dirty = True
+
+    def clear(self):
+        self.data = {}
+        self.dirty = True
+
+    def save(self):
+        """
+        Write the store back to the RTC memory, only if it has been modified.
+        If the data does not fit, the EXPENDABLE keys are dropped until it does,
+        so that an oversized diagnostic does not lose the state of the device
+        :return: bool; True if the data fit in the RTC memory
+        """
+        if not self.dirty:
+            return True
+        raw = self.MAGIC + ujson.dumps(self.data).encode()
+        for key in self.EXPENDABLE:
+            if len(raw) <= self.MAX_BYTES:
+                break
+            if key in self.data:
+                print('RTC memory overflow: ' + str(len(raw)) + ' bytes, ' + key + ' dropped')
+                del self.data[key]
+                raw = self.MAGIC + ujson.dumps(self.data).encode()
+        if len(raw) > self.MAX_BYTES:
+            print('RTC memory overflow: ' + str(len(raw)) + ' bytes')
+            return False
+        self.rtc.memory(raw)
+        self.dirty = False
+        return True
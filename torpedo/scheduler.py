@@ -0,0 +1,77 @@
+import math
+import utime
+
+
+class SleepScheduler:
+    """
+    Choose the deep sleep interval from the fermentation activity.
+    The SG readings of the last wakes are kept in the RTC memory; the slope of
+    the SG is fitted over them, the interval is shortened while the gravity is
+    dropping fast and stretched when it is stable.
+    """
+    STORE_KEY = 'sched'
+    HISTORY = 12  # number of readings the slope is fitted on
+    MIN_READINGS = 4
+
+    def __init__(self, rtc_store, default_ms, min_ms, max_ms, active_slope=0.005, stable_slope=0.001):
+        """
+        :param rtc_store: RTCStore object
+        :param default_ms: int; interval used until there are enough readings to fit the slope
+        :param min_ms: int; interval during active fermentation
+        :param max_ms: int; interval when the gravity is stable
+        :param active_slope: float; SG drop per day above which the fermentation is considered active
+        :param stable_slope: float; SG drop per day below which the gravity is considered stable
+        """
+        self.rtc_store = rtc_store
+        self.min_ms = min(min_ms, max_ms)
+        self.max_ms = max(min_ms, max_ms)
+        self.default_ms = min(max(default_ms, self.min_ms), self.max_ms)
+        self.active_slope = active_slope
+        self.stable_slope = stable_slope
+        state = rtc_store.get(self.STORE_KEY) or {}
+        self.history = state.get('h', [])  # [time in s, sg]
+
+    def add(self, sg):
+        """
+        Add the SG of this wake, and work out the next interval
+        :return: int; the next deep sleep interval in ms
+        """
+        if sg is not None:
+            self.history.append([utime.time(), sg])
+            self.history = self.history[-self.HISTORY:]
+        self.rtc_store.set(self.STORE_KEY, {'h': self.history})
+        return self.compute_interval()
+
+    def slope(self):
+        """
+        Least squares slope of the SG readings, with its standard error
+        :return: tuple; (SG change per day, standard error), None if there are not enough readings
+        """
+        n = len(self.history)
+        if n < self.MIN_READINGS:
+            return None
+        t0 = self.history[0][0]
+        days = [(r[0] - t0) / 86400 for r in self.history]
+        sgs = [r[1] for r in self.history]
+        mean_t = sum(days) / n
+        mean_sg = sum(sgs) / n
+        var_t = sum((t - mean_t) ** 2 for t in days)
+        if not var_t:
+            return None
+        slope = sum((days[i] - mean_t) * (sgs[i] - mean_sg) for i in range(n)) / var_t
+        residuals = sum((sgs[i] - mean_sg - slope * (days[i] - mean_t)) ** 2 for i in range(n))
+        return slope, math.sqrt(residuals / (n - 2) / var_t)
+
+    def compute_interval(self):
+        fit = self.slope()
+        if fit is None:
+            return self.default_ms
+        slope, std_err = fit
+        # only the part of the slope that stands out of the noise of the readings counts as activity
+        activity = max(abs(slope) - 2 * std_err, 0)
+        if activity >= self.active_slope:
+            return self.min_ms
+        if activity <= self.stable_slope:
+            return self.max_ms
+        ratio = (activity - self.stable_slope) / (self.active_slope - self.stable_slope)
+        return int(self.max_ms - ratio * (self.max_ms - self.min_ms))
@@ -0,0 +1,77 @@
+"""
+Temperature compensation of the accelerometer offsets of the MPU6050.
+
+The offset of each accelerometer axis drifts linearly with the die temperature:
+    offset = k * (temperature - t0)
+with k in g/C, and t0 the reference temperature where the offsets are taken as 0.
+The model of the device is kept in regression.json with the calibration data:
+    "tempComp": {"t0": 21.4, "k": [0.0002, -0.0011, 0.0004]}
+
+To fit it, let the hydrometer float in plain water (so that the tilt does not
+change) with "tempCompLog" enabled in working mode, while the temperature goes
+through the range of the fermentation: every wake appends the die temperature
+and the accelerometer reading to LOG_PATH. fit() then works out the slope of
+each axis against the temperature, in calibration mode from the /tempcomp API.
+"""
+import uos
+
+LOG_PATH = 'tempcomp.csv'
+MIN_SAMPLES = 10
+MIN_SPAN = 5  # C, temperature range of the log needed to fit the model
+
+
+def log_sample(gy521, path=LOG_PATH):
+    """
+    Append the die temperature and the accelerometer reading (in g) of the last burst of the GY521 object
+    """
+    if gy521.burst is None:
+        return
+    temp, ax, ay, az = gy521.burst
+    scale = gy521.imu._accel_scale
+    with open(path, 'a') as f:
+        f.write('%.2f,%.5f,%.5f,%.5f\n' % (temp, ax * scale, ay * scale, az * scale))
+
+
+def load_log(path=LOG_PATH):
+    """
+    :return: list; of [temperature, ax, ay, az]
+    """
+    samples = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    samples.append([float(v) for v in line.split(',')])
+                except ValueError:
+                    pass
+    except OSError:
+        pass
+    return samples
+
+
+def clear_log(path=LOG_PATH):
+    try:
+        uos.remove(path)
+    except OSError:
+        pass
+
+
+def fit(samples):
+    """
+    Least squares slope of each accelerometer axis against the temperature
+    :param samples: list; of [temperature, ax, ay, az]
+    :return: dict; the model, e.g. {'t0': 21.4, 'k': [0.0002, -0.0011, 0.0004]}
+    """
+    n = len(samples)
+    if n < MIN_SAMPLES:
+        raise ValueError('Not enough samples: ' + str(n))
+    temps = [s[0] for s in samples]
+    if max(temps) - min(temps) < MIN_SPAN:
+        raise ValueError('The temperature range is too narrow')
+    t0 = sum(temps) / n
+    var = sum((t - t0) ** 2 for t in temps)
+    k = []
+    for axis in (1, 2, 3):
+        mean = sum(s[axis] for s in samples) / n
+        k.append(sum((s[0] - t0) * (s[axis] - mean) for s in samples) / var)
+    return {'t0': round(t0, 2), 'k': k}
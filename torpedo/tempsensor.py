@@ -1,7 +1,8 @@
 import machine
+import utime
 import onewire
 import ds18x20
-import utime
+from ready import wait_until
 
 
 class RomCodeConvert:
@@ -31,15 +32,22 @@ class RomCodeConvert:
 
 
 class Ds18Sensors(RomCodeConvert):
-    def __init__(self, pin):
+    CACHE_KEY = 'ds18'
+    # conversion time (ms) for each resolution (bits)
+    CONVERSION_MS = {9: 94, 10: 188, 11: 375, 12: 750}
+
+    def __init__(self, pin, rtc_store=None):
         """
         Initialize the DS18 temperature sensor
         :param pin: int; GPIO for OneWire
+        :param rtc_store: RTCStore object; if given, the ROM codes found on the bus are cached in the RTC memory
         """
         self.ow = onewire.OneWire(machine.Pin(pin))
         self.ds = ds18x20.DS18X20(self.ow)
         self.device_list = None
         self.last_reading_available = False
+        self.resolution = 12  # the power on default
+        self.rtc_store = rtc_store
 
     def get_device_list(self):
         self.device_list = self.ds.scan()
@@ -49,6 +57,29 @@ class Ds18Sensors(RomCodeConvert):
             for bytearray_romcode in self.device_list
         ]
 
+    def get_romcodes(self):
+        """
+        ROM codes of the sensors on the bus.  They are cached in the RTC memory,
+        so that the bus is only searched on the first wake, or after forget_romcodes()
+        :return: list; of hex strings, e.g. ['0x28aaec0119130238']
+        """
+        cache = self.rtc_store.get(self.CACHE_KEY) if self.rtc_store is not None else None
+        if cache:
+            return cache
+        self.device_list = self.ds.scan()
+        romcodes = [self.from_romcode_to_hex_string(bytearray_romcode) for bytearray_romcode in self.device_list]
+        if romcodes and self.rtc_store is not None:
+            self.rtc_store.set(self.CACHE_KEY, romcodes)
+        return romcodes
+
+    def forget_romcodes(self):
+        """
+        Drop the cached ROM codes, the bus is searched again by the next get_romcodes()
+        """
+        self.device_list = None
+        if self.rtc_store is not None:
+            self.rtc_store.remove(self.CACHE_KEY)
+
     def get_device_qty(self):
         if not self.device_list:
             self.device_list = self.ds.scan()
@@ -56,8 +87,14 @@ class Ds18Sensors(RomCodeConvert):
     
     def get_realtime_temp(self):
         """
-        Perform a measurement of the temperature and return the temperature
-        :return: float; realtime temperature in Celsius measured by the DS18 sensor
+        Start a temperature conversion of all the sensors on the bus,
+        the result is read once wait_conversion() has returned
+        """
+        self.start_conversion()
+
+    def start_conversion(self):
+        """
+        Start a temperature conversion of all the sensors on the bus, without waiting for it
         """
         try:
             self.ds.convert_temp()
@@ -66,6 +103,56 @@ class Ds18Sensors(RomCodeConvert):
         else:
             self.last_reading_available = True
 
+    def wait_conversion(self, timeout=None):
+        """
+        Wait for the end of the temperature conversion by polling the bus.
+        The DS18B20 answers the read time slots with 0 while converting and 1 when done.
+        :param timeout: int; deadline in ms, by default the conversion time of the resolution plus a margin
+        :return: bool; True if the conversion has completed
+        """
+        if not self.last_reading_available:
+            return False
+        if timeout is None:
+            timeout = self.CONVERSION_MS[self.resolution] + 50
+        return wait_until(self.ow.readbit, timeout, poll_ms=10)
+
+    def finish_conversion(self, timeout=None):
+        """
+        Wait for the end of the temperature conversion, and if it has not ended by the deadline, for a 12-bit
+        conversion (the sensor may not have the resolution which has been set).  Until a conversion has ended,
+        the scratchpad holds the power on value of 85C, which must not be read as a temperature.
+        :param timeout: int; deadline in ms, by default the conversion time of the resolution plus a margin
+        :return: bool; True if the conversion has completed
+        """
+        if self.wait_conversion(timeout):
+            return True
+        return self.last_reading_available and self.wait_conversion(self.CONVERSION_MS[12] + 50)
+
+    def set_resolution(self, romcode_bytearray, bits):
+        """
+        Set the resolution of a sensor. The configuration is copied to the EEPROM of the sensor,
+        so that it survives the power cycles, but only when it has changed.
+        :param romcode_bytearray: bytearray
+        :param bits: int; 9, 10, 11 or 12, the conversion time halves with every bit less
+        :return: bool; True if the configuration has been written
+        """
+        if bits not in self.CONVERSION_MS:
+            raise ValueError('The resolution must be 9, 10, 11 or 12 bits')
+        config = (bits - 9) << 5 | 0x1F
+        scratch = self.ds.read_scratch(romcode_bytearray)
+        # the conversion time follows the resolution the sensor has, which is only changed once written
+        self.resolution = (scratch[4] >> 5 & 0x03) + 9
+        if scratch[4] & 0x7F == config:
+            return False
+        # TH and TL are written back unchanged
+        self.ds.write_scratch(romcode_bytearray, bytearray((scratch[2], scratch[3], config)))
+        self.ow.reset(True)
+        self.ow.select_rom(romcode_bytearray)
+        self.ow.writebyte(0x48)  # Copy Scratchpad
+        utime.sleep_ms(10)  # EEPROM write time
+        self.resolution = bits
+        return True
+
 
 class SingleTempSensor(RomCodeConvert):
     def __init__(self, ds_obj, romcode_hex_string):
@@ -75,7 +162,9 @@ class SingleTempSensor(RomCodeConvert):
 
     def read_temp(self):
         self.ds_obj.get_realtime_temp()
-        utime.sleep_ms(500)
+        if not self.ds_obj.finish_conversion():
+            print('The DS18 conversion has not completed.')
+            return None
         try:
             temp = round(self.ds_obj.ds.read_temp(self.bytearray_romcode), 1)
         except Exception as e:
@@ -104,3 +193,108 @@ class SingleTempSensor(RomCodeConvert):
 
     def isconnected(self):
         return self.is_connected
+
+
+class MultiTempSensor(RomCodeConvert):
+    """
+    Several DS18 sensors on the same bus, e.g. a probe in the wort and one in the air of the fermentation chamber.
+    One conversion is broadcast to all the sensors (Skip ROM), then each of them is read by its ROM code,
+    so that N sensors take the time of a single conversion.
+    Usage:
+        ow = Ds18Sensors(pin, rtc_store)
+        sensors = MultiTempSensor(ow, ow.get_romcodes(), {'0x28aaec0119130238': 'wort'})
+        sensors.start()
+        temps = sensors.collect()  # e.g. {'wort': 19.5, 'ambient': 21.2}
+    """
+    DEFAULT_LABELS = ('wort', 'ambient')
+    PRIMARY = 'wort'  # the temperature of the gravity reading
+
+    def __init__(self, ds_obj, romcode_hex_strings, labels=None):
+        """
+        :param ds_obj: Ds18Sensors object
+        :param romcode_hex_strings: list; of str, the ROM codes of the sensors, e.g. from Ds18Sensors.get_romcodes()
+        :param labels: dict; label of a ROM code, e.g. {'0x28aaec0119130238': 'ambient'}.  The other sensors are
+            labeled 'wort', then 'ambient', in the order of the bus, then by their ROM code
+        """
+        if not romcode_hex_strings:
+            raise ValueError('No DS18 sensor on the bus')
+        self.ds_obj = ds_obj
+        self.labels = labels or {}
+        self.sensors = []  # (label, bytearray romcode)
+        self.primary = None
+        self.set_romcodes(romcode_hex_strings)
+
+    def set_romcodes(self, romcode_hex_strings):
+        self.ds_obj.last_reading_available = False
+        defaults = [label for label in self.DEFAULT_LABELS if label not in self.labels.values()]
+        self.sensors = []
+        for romcode in romcode_hex_strings:
+            label = self.labels.get(romcode) or (defaults.pop(0) if defaults else romcode)
+            self.sensors.append((label, self.from_hex_string_to_romcode(romcode)))
+        labels = [label for label, _ in self.sensors]
+        self.primary = self.PRIMARY if self.PRIMARY in labels else labels[0]
+
+    def get_romcodes(self):
+        return [self.from_romcode_to_hex_string(romcode) for _, romcode in self.sensors]
+
+    def start(self):
+        """
+        Start the conversion of all the sensors, so that it runs while the rest of the wake cycle is done
+        """
+        self.ds_obj.start_conversion()
+
+    def set_resolution(self, bits):
+        """
+        :param bits: int; 9, 10, 11 or 12, for all the sensors
+        """
+        for label, romcode in self.sensors:
+            try:
+                self.ds_obj.set_resolution(romcode, bits)
+            except Exception as e:
+                print('Failed to set the resolution of the DS18 sensor ' + label + ': ' + str(e))
+
+    def collect(self, timeout=None):
+        """
+        Wait for the end of the conversion started by start() (started now if it has not been), then read it
+        :param timeout: int; deadline in ms, by default the conversion time of the resolution plus a margin
+        :return: dict; temperature in Celsius of each label, None for the sensors which can not be read
+        """
+        if not self.ds_obj.last_reading_available:
+            self.ds_obj.start_conversion()
+        if self.ds_obj.finish_conversion(timeout):
+            temps = self._read()
+        else:
+            print('The DS18 conversion has not completed.')
+            temps = dict((label, None) for label, _ in self.sensors)
+        if None in temps.values() and self.rescan():
+            # the resolution of the new sensors is not known, wait for a 12-bit conversion
+            self.ds_obj.start_conversion()
+            if self.ds_obj.wait_conversion(self.ds_obj.CONVERSION_MS[12] + 50):
+                temps = self._read()
+            else:
+                temps = dict((label, None) for label, _ in self.sensors)
+        return temps
+
+    def _read(self):
+        temps = {}
+        for label, romcode in self.sensors:
+            try:
+                temps[label] = round(self.ds_obj.ds.read_temp(romcode), 1)
+            except Exception:
+                print('The DS18 sensor ' + label + ' was disconnected.  Check the wire.')
+                temps[label] = None
+        return temps
+
+    def rescan(self):
+        """
+        Search the bus again after a failed read (CRC error, no answer), in case a sensor has been replaced
+        :return: bool; True if the sensors on the bus have changed
+        """
+        current = self.get_romcodes()
+        self.ds_obj.forget_romcodes()
+        romcodes = self.ds_obj.get_romcodes()
+        if not romcodes or sorted(romcodes) == sorted(current):
+            return False
+        print('DS18 sensors found on the bus: ' + ', '.join(romcodes))
+        self.set_romcodes(romcodes)
+        return True
@@ -0,0 +1,75 @@
+from array import array
+from math import atan, sqrt, pi
+
+# atan(sqrt(i / 256)) in centidegrees, for i = 0..256
+ATAN_SQRT_LUT = array('H', (
+    0, 358, 505, 618, 713, 796, 870, 939, 1002, 1062, 1118, 1171, 1222, 1270, 1316, 1361,
+    1404, 1445, 1485, 1524, 1562, 1598, 1634, 1669, 1702, 1735, 1768, 1799, 1830, 1860, 1890, 1919,
+    1947, 1975, 2002, 2029, 2056, 2082, 2107, 2132, 2157, 2181, 2205, 2229, 2252, 2275, 2297, 2319,
+    2341, 2363, 2384, 2405, 2426, 2447, 2467, 2487, 2507, 2526, 2545, 2564, 2583, 2602, 2620, 2639,
+    2657, 2674, 2692, 2709, 2727, 2744, 2761, 2777, 2794, 2810, 2826, 2843, 2858, 2874, 2890, 2905,
+    2921, 2936, 2951, 2966, 2981, 2995, 3010, 3024, 3038, 3052, 3066, 3080, 3094, 3108, 3121, 3135,
+    3148, 3161, 3175, 3188, 3201, 3213, 3226, 3239, 3251, 3264, 3276, 3288, 3300, 3313, 3325, 3336,
+    3348, 3360, 3372, 3383, 3395, 3406, 3417, 3429, 3440, 3451, 3462, 3473, 3484, 3494, 3505, 3516,
+    3526, 3537, 3547, 3558, 3568, 3578, 3589, 3599, 3609, 3619, 3629, 3639, 3648, 3658, 3668, 3677,
+    3687, 3697, 3706, 3715, 3725, 3734, 3743, 3752, 3762, 3771, 3780, 3789, 3798, 3807, 3815, 3824,
+    3833, 3842, 3850, 3859, 3867, 3876, 3884, 3893, 3901, 3909, 3918, 3926, 3934, 3942, 3950, 3958,
+    3966, 3974, 3982, 3990, 3998, 4006, 4014, 4021, 4029, 4037, 4044, 4052, 4060, 4067, 4074, 4082,
+    4089, 4097, 4104, 4111, 4119, 4126, 4133, 4140, 4147, 4154, 4161, 4168, 4175, 4182, 4189, 4196,
+    4203, 4210, 4217, 4224, 4230, 4237, 4244, 4250, 4257, 4264, 4270, 4277, 4283, 4290, 4296, 4302,
+    4309, 4315, 4322, 4328, 4334, 4340, 4347, 4353, 4359, 4365, 4371, 4377, 4384, 4390, 4396, 4402,
+    4408, 4414, 4419, 4425, 4431, 4437, 4443, 4449, 4455, 4460, 4466, 4472, 4477, 4483, 4489, 4494,
+    4500,
+))
+
+
+def _atan_sqrt(n, d):
+    """
+    atan(sqrt(n / d)) in centidegrees, for 0 <= n <= d
+    """
+    if not d:
+        return 0
+    # n / d in 1/4096, keeping the intermediate values small ints
+    if d < 0x40000:
+        q = (n << 12) // d
+    else:
+        q = min(n // (d >> 12), 4096)
+    idx = q >> 4
+    if idx < 4:
+        # atan(sqrt(u)) is too steep below 7 degrees for a linear interpolation
+        return round(atan(sqrt(n / d)) * 18000 / pi)
+    if idx == 256:
+        return 4500
+    low = ATAN_SQRT_LUT[idx]
+    return low + (((ATAN_SQRT_LUT[idx + 1] - low) * (q & 15) + 8) >> 4)
+
+
+def tilt_cdeg(axis, ax, ay, az):
+    """
+    Tilt angle of one axis in centidegrees, from raw int16 accelerometer counts.
+    Uses integer math and a lookup table, the accelerometer range does not matter.
+    :param axis: int; 0 for alpha (x axis against the level surface), 1 for beta (y axis
+        against the level surface), 2 for gamma (z axis against the gravity)
+    :return: int; same angles as GY521.get_tilt_angles(), in 1/100 degree
+    """
+    # halve the counts so that the sums of squares stay small ints on the ESP32
+    ax >>= 1
+    ay >>= 1
+    az >>= 1
+    if axis == 0:
+        sign = ax
+        n = ax * ax
+        d = ay * ay + az * az
+    elif axis == 1:
+        sign = ay
+        n = ay * ay
+        d = ax * ax + az * az
+    else:
+        sign = az
+        n = ax * ax + ay * ay
+        d = az * az
+    if n <= d:
+        angle = _atan_sqrt(n, d)
+    else:
+        angle = 9000 - _atan_sqrt(d, n)
+    return -angle if sign < 0 else angle
@@ -24,6 +24,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 '''
 
+from array import array
 from utime import sleep_ms
 from math import sqrt, degrees, acos, atan2
 
@@ -146,3 +147,79 @@ class Vector3d(object):
     @property
     def scale(self):
         return tuple(self._scale)
+
+
+class ArrayVector3d(Vector3d):
+    '''
+    Vector3d keeping its values in preallocated arrays. The calibrated,
+    transposed and scaled values are worked out in place at every update,
+    so reading the vector does not build lists and closures on the heap.
+    Same property API as Vector3d.
+    '''
+    def __init__(self, transposition, scaling, update_function):
+        self.argcheck(transposition, "Transposition")
+        self.argcheck(scaling, "Scaling")
+        if set(transposition) != {0, 1, 2}:
+            raise ValueError('Transpose indices must be unique and in range 0-2')
+        self._vector = array('f', (0, 0, 0))
+        self._ivector = array('h', (0, 0, 0))
+        self._cal = array('f', (0, 0, 0))
+        self._out = array('f', (0, 0, 0))       # vehicle relative values
+        self._scale = tuple(scaling)
+        self._transpose = tuple(transposition)
+        self._device_update = update_function
+
+    def update(self):
+        self._device_update()
+        self.apply()
+
+    def apply(self):
+        '''
+        Works out the vehicle relative values from the values set by the device
+        '''
+        vector = self._vector
+        cal = self._cal
+        out = self._out
+        t = self._transpose
+        s = self._scale
+        out[0] = (vector[t[0]] - cal[t[0]]) * s[0]
+        out[1] = (vector[t[1]] - cal[t[1]]) * s[1]
+        out[2] = (vector[t[2]] - cal[t[2]]) * s[2]
+
+    @property
+    def cal(self):
+        return tuple(self._cal)
+
+    @cal.setter
+    def cal(self, offsets):
+        self._cal[0] = offsets[0]
+        self._cal[1] = offsets[1]
+        self._cal[2] = offsets[2]
+
+    @property
+    def vector(self):
+        '''
+        Array of the vehicle relative values of the last update, updated in place
+        '''
+        return self._out
+
+    @property
+    def x(self):
+        self.update()
+        return self._out[0]
+
+    @property
+    def y(self):
+        self.update()
+        return self._out[1]
+
+    @property
+    def z(self):
+        self.update()
+        return self._out[2]
+
+    @property
+    def xyz(self):
+        self.update()
+        out = self._out
+        return out[0], out[1], out[2]
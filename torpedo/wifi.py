@@ -1,9 +1,23 @@
 import network
+import ubinascii
 import utime
 
 
 class WiFi:
-    def __init__(self):
+    CACHE_KEY = 'wifi'
+    STATS_KEY = 'wifi_stats'
+    FAST_TIMEOUT_MS = 4000  # give up the fast reconnect after that time
+    LEASE_RENEW_S = 43200  # renew the DHCP lease with a full connect after 12 hours, half of a common lease time
+
+    def __init__(self, rtc_store=None):
+        """
+        :param rtc_store: RTCStore object; if given, the BSSID, channel and IP
+            configuration of the last connection are cached in the RTC memory
+            to reconnect faster after a deep sleep
+        """
+        self.rtc_store = rtc_store
+        self.scanned = {}  # ssid: (bssid, channel) found by the last scan
+        self.connect_path = None  # 'fast' or 'full'
         self.ap_ip_addr = None
         self.sta_ip_addr = None
         self.ap = network.WLAN(network.AP_IF)  # Start AP mode
@@ -12,6 +26,8 @@ class WiFi:
         self.sta.active(True)
         self.ssid = None
         self.pwd = None
+        self.connecting = None  # (ssid, password) of a connection in progress
+        self.connect_start = 0
 
     def ap_start(self, ssid):
         """
@@ -59,6 +75,8 @@ class WiFi:
         """
         scanned_wifi = self.sta.scan()
         wifi_list = [str(wifi[0], 'utf8') for wifi in scanned_wifi]
+        for wifi in scanned_wifi:
+            self.scanned[str(wifi[0], 'utf8')] = (wifi[1], wifi[2])
         return list(set(wifi_list))
 
     def verify_ap(self, ap_ssid):
@@ -69,6 +87,10 @@ class WiFi:
         Connect to an Access Point by its SSID and Password
         return: string; the IP of the STA
         """
+        # A cached AP does not need to be verified by a scan
+        if self.get_cache(ap_ssid):
+            self.sta_connect_start(ap_ssid, ap_pass)
+            return self.sta_connect_wait()
         # Attempt connection only if SSID can be found
         if verify_ap:
             if not self.verify_ap(ap_ssid):
@@ -105,7 +127,144 @@ class WiFi:
             # if successfully connected, store the SSID & Password
             self.ssid = ap_ssid
             self.pwd = ap_pass
+            self.save_cache(ap_ssid)
+            return self.get_sta_ip_addr()
+
+    def sta_connect_start(self, ap_ssid, ap_pass):
+        """
+        Start connecting to an Access Point without waiting for the connection,
+        so that other work can be done while the association and DHCP are in progress.
+        Call sta_connect_wait() to get the result.
+        If the AP is cached in the RTC memory, a directed reconnect with a static IP is attempted first.
+        """
+        if self.sta.isconnected():
+            print('Disconnecting from current network...')
+            self.sta.disconnect()
+        self.connecting = (ap_ssid, ap_pass)
+        self.connect_start = utime.ticks_ms()
+        cache = self.get_cache(ap_ssid)
+        # the time of the lease is measured by the RTC, which keeps counting during the deep sleep
+        if cache and utime.time() - cache.get('t', 0) < self.LEASE_RENEW_S:
+            print('Reconnecting to "' + ap_ssid + '"...')
+            self.connect_path = 'fast'
+            self.sta.ifconfig(tuple(cache['ip']))
+            try:
+                self.sta.config(channel=cache['ch'])
+            except Exception:
+                pass
+            self.sta.connect(ap_ssid, ap_pass, bssid=ubinascii.unhexlify(cache['bssid']))
+        else:
+            self._full_connect(ap_ssid, ap_pass)
+
+    def _full_connect(self, ap_ssid, ap_pass):
+        """
+        Scan for the AP if it has not been seen yet (to learn its BSSID and channel), then connect with DHCP
+        """
+        print('Connecting to "' + ap_ssid + '"...')
+        self.connect_path = 'full'
+        try:
+            self.sta.ifconfig('dhcp')
+        except Exception:
+            self.sta.active(False)
+            self.sta.active(True)
+        if self.rtc_store is not None and ap_ssid not in self.scanned and not self.get_cache(ap_ssid):
+            self.scan_wifi_list()
+        self.sta.connect(ap_ssid, ap_pass)
+
+    def sta_connect_wait(self, timeout=20000):
+        """
+        Wait for the connection started by sta_connect_start()
+        :param timeout: int; timeout in ms, counted from the call of sta_connect_start()
+        return: string; the IP of the STA, None if timeout
+        """
+        if not self.connecting:
             return self.get_sta_ip_addr()
+        ap_ssid, ap_pass = self.connecting
+        while not self.sta.isconnected():
+            elapsed = utime.ticks_diff(utime.ticks_ms(), self.connect_start)
+            if elapsed > timeout:
+                print('Connecting to "' + ap_ssid + '" Timeout')
+                self.connecting = None
+                self.update_stats(None, elapsed)
+                return None
+            if self.connect_path == 'fast' and (elapsed > self.FAST_TIMEOUT_MS or self.sta.status() in (
+                    network.STAT_NO_AP_FOUND, network.STAT_WRONG_PASSWORD)):
+                # The AP has moved or the cached configuration is stale
+                print('Fast reconnect failed')
+                self.clear_cache()
+                self.scanned.pop(ap_ssid, None)
+                self.sta.disconnect()
+                self._full_connect(ap_ssid, ap_pass)
+                self.connect_path = 'fallback'
+            utime.sleep_ms(50)
+        print('Network "' + ap_ssid + '" Connected!')
+        self.ssid = ap_ssid
+        self.pwd = ap_pass
+        self.connecting = None
+        self.save_cache(ap_ssid)
+        self.update_stats(self.connect_path, utime.ticks_diff(utime.ticks_ms(), self.connect_start))
+        return self.get_sta_ip_addr()
+
+    def get_cache(self, ap_ssid):
+        """
+        Return the cached connection of the AP, None if not cached
+        """
+        if self.rtc_store is None:
+            return None
+        cache = self.rtc_store.get(self.CACHE_KEY)
+        if cache and cache.get('ssid') == ap_ssid:
+            return cache
+        return None
+
+    def save_cache(self, ap_ssid):
+        """
+        Cache the BSSID, channel and IP configuration of the current connection
+        """
+        if self.rtc_store is None:
+            return
+        cache = self.get_cache(ap_ssid)
+        if ap_ssid in self.scanned:
+            bssid, channel = self.scanned[ap_ssid]
+            bssid = ubinascii.hexlify(bssid).decode()
+        elif cache:
+            bssid, channel = cache['bssid'], cache['ch']
+        else:
+            return
+        # time of the last DHCP lease, the fast reconnects reuse it
+        t = cache.get('t', 0) if cache and self.connect_path == 'fast' else utime.time()
+        self.rtc_store.set(self.CACHE_KEY, {
+            'ssid': ap_ssid,
+            'bssid': bssid,
+            'ch': channel,
+            'ip': list(self.sta.ifconfig()),
+            't': t
+        })
+
+    def clear_cache(self):
+        if self.rtc_store is not None:
+            self.rtc_store.remove(self.CACHE_KEY)
+
+    def update_stats(self, path, elapsed_ms):
+        """
+        Count which connection path has been taken, and keep the last connection time
+        :param path: str; 'fast', 'full', 'fallback' or None if the connection failed
+        """
+        if self.rtc_store is None:
+            return
+        stats = self.rtc_store.get(self.STATS_KEY, {})
+        key = path or 'failed'
+        stats[key] = stats.get(key, 0) + 1
+        stats['last'] = key
+        stats['ms'] = elapsed_ms
+        self.rtc_store.set(self.STATS_KEY, stats)
+
+    def get_stats(self):
+        """
+        :return: dict; e.g. {'fast': 12, 'full': 1, 'last': 'fast', 'ms': 420}
+        """
+        if self.rtc_store is None:
+            return {}
+        return self.rtc_store.get(self.STATS_KEY, {})
 
     def is_connected(self):
         return self.sta.isconnected()